@@ -3,7 +3,7 @@
 """
 
 from .sapscriptwizard import Sapscript
-from .window import Window
+from .window import Window, BoundScreen
 from .shell_table import ShellTable
 # --- НОВЫЙ КОД ---
 from .gui_tree import GuiTree # Добавляем импорт нового класса
@@ -5,7 +5,7 @@ import win32com.client
 import logging
 import time
 import re
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence
 
 # Используем относительный импорт для хелперов
 from .locator_helpers import (
@@ -217,7 +217,8 @@ class SapElementFinder:
              return elements
          return [elem for elem in elements if elem.element_type in target_types]
 
-    def find_element(self, locator_str: str, target_element_types: Optional[List[str]] = None) -> Optional[str]:
+    def find_element(self, locator_str: str, target_element_types: Optional[Sequence[str]] = None,
+                     first_hit_only: bool = False) -> Optional[str]:
         """
         Основной метод поиска элемента по семантическому локатору.
 
@@ -226,6 +227,8 @@ class SapElementFinder:
             target_element_types: Опциональный список типов элементов для поиска
                                   (e.g., ["GuiTextField", "GuiCTextField"]). Если None,
                                   используется DEFAULT_TARGET_TYPES.
+            first_hit_only: Вернуть первый подходящий элемент, не выбирая ближайший к метке
+                            (достаточно для проверки существования).
 
         Returns:
             ID найденного элемента или None.
@@ -283,6 +286,8 @@ class SapElementFinder:
                         if dist < min_dist:
                             min_dist = dist
                             closest_right = target
+                            if first_hit_only:
+                                break
                 found_element = closest_right
             else:
                 log.debug(f"Label '{strategy.label}' not found for HLabel search.")
@@ -300,6 +305,8 @@ class SapElementFinder:
                         if dist < min_dist:
                             min_dist = dist
                             closest_below = target
+                            if first_hit_only:
+                                break
                 found_element = closest_below
             else:
                 log.debug(f"Label '{strategy.label}' not found for VLabel search.")
@@ -325,6 +332,8 @@ class SapElementFinder:
                         if dist_sq < min_dist_sq:
                             min_dist_sq = dist_sq
                             best_match = target
+                            if first_hit_only:
+                                break
                 found_element = best_match
             else:
                  log.debug(f"One or both labels not found for HLabelVLabel search: H='{strategy.h_label}', V='{strategy.v_label}'")
@@ -335,15 +344,19 @@ class SapElementFinder:
                          next((el for el in candidate_elements if el.text == strategy.left_label), None)
              if left_elem:
                   # Ищем правый элемент по тексту/тултипу среди кандидатов
-                  possible_right_elements = [
+                  right_elements = (
                       el for el in candidate_elements
                       if (el.text == strategy.right_label or el.tooltip == strategy.right_label)
                          and el.position.is_horizontally_aligned_with(left_elem.position)
                          and el.position.is_right_of(left_elem.position)
-                  ]
-                  # Выбираем ближайший из найденных справа
-                  if possible_right_elements:
-                      found_element = min(possible_right_elements, key=lambda el: el.position.left - left_elem.position.right)
+                  )
+                  if first_hit_only:
+                      found_element = next(right_elements, None)
+                  else:
+                      possible_right_elements = list(right_elements)
+                      # Выбираем ближайший из найденных справа
+                      if possible_right_elements:
+                          found_element = min(possible_right_elements, key=lambda el: el.position.left - left_elem.position.right)
              else:
                   log.debug(f"Left element '{strategy.left_label}' not found for HLabelHLabel search.")
 
@@ -358,4 +371,11 @@ class SapElementFinder:
             log.warning(f"Could not find element using locator: '{locator_str}'")
             return None
 
+    def element_exists(self, locator_str: str, target_element_types: Optional[Sequence[str]] = None) -> bool:
+        """
+        Проверяет, находится ли элемент по семантическому локатору.
+        В отличие от find_element, останавливается на первом подходящем элементе.
+        """
+        return self.find_element(locator_str, target_element_types, first_hit_only=True) is not None
+
 # --- END OF FILE: pysapscript/element_finder.py ---
\ No newline at end of file
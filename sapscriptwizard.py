@@ -7,13 +7,21 @@ import logging # Added for logging
 from pathlib import Path
 from subprocess import Popen
 from datetime import datetime
-from typing import Optional, Dict, Any, List, Union # Ensure necessary types are imported
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Union, Callable, Deque # Ensure necessary types are imported
 
+import pythoncom
 import win32com.client
 try:
     from PIL import ImageGrab # Pillow library for screenshots
 except ImportError:
     ImageGrab = None # Handle case where Pillow is not installed
+try:
+    import mss # Fast screen capture, preferred over ImageGrab when available
+    import mss.tools
+except ImportError:
+    mss = None # Fall back to Pillow's ImageGrab
 
 # Adjust imports based on your structure
 from . import window # Use relative import if window.py is in the same directory/package
@@ -30,12 +38,18 @@ class Sapscript:
     Handles launching SAP, attaching to sessions, managing windows,
     and providing access to GUI elements.
     """
-    def __init__(self, default_window_title: str = "SAP Easy Access") -> None:
+    # Shared by all instances: single background worker that writes screenshots
+    _screenshot_executor: Optional[ThreadPoolExecutor] = None
+    _pending_screenshots: Deque[Future] = deque(maxlen=16)
+
+    def __init__(self, default_window_title: str = "SAP Easy Access", screenshots_sync: bool = False) -> None:
         """
         Initializes the Sapscript object.
 
         Args:
             default_window_title (str): Default SAP window title used for checks.
+            screenshots_sync (bool): Save error screenshots in the calling thread instead of
+                                     a background thread. Defaults to False.
         """
         self._sap_gui_auto: Optional[win32com.client.CDispatch] = None
         self._application: Optional[win32com.client.CDispatch] = None
@@ -43,6 +57,9 @@ class Sapscript:
         # --- Screenshot Attributes ---
         self._screenshots_on_error_enabled: bool = True # Enabled by default
         self._screenshot_directory: Optional[Path] = None # Default to current dir
+        self._mss: Optional[Any] = None # mss.mss() instance, created on first screenshot
+        self.screenshots_sync: bool = screenshots_sync
+        self._dispid_history: Optional[int] = None # DISPID of _application.HistoryEnabled, resolved on first use
         # --- History Attribute (managed by methods) ---
         # self._manage_history = False # Example if we wanted auto-management
 
@@ -79,6 +96,7 @@ class Sapscript:
             try:
                 log.debug("Attempting to GetScriptingEngine...")
                 self._application = self._sap_gui_auto.GetScriptingEngine
+                self._dispid_history = None # New engine object, cached DISPID no longer applies
                 log.debug("GetScriptingEngine successful.")
             except Exception as e:
                  log.error(f"Failed to GetScriptingEngine: {e}")
@@ -571,8 +589,8 @@ class Sapscript:
 
     def enable_screenshots_on_error(self) -> None:
         """Enables automatic screenshot capture on exceptions handled by handle_exception_with_screenshot."""
-        if ImageGrab is None:
-            log.warning("Pillow library not found. Screenshots on error cannot be enabled. Install with: pip install Pillow")
+        if mss is None and ImageGrab is None:
+            log.warning("Neither mss nor Pillow library found. Screenshots on error cannot be enabled. Install with: pip install mss")
             self._screenshots_on_error_enabled = False
         else:
             self._screenshots_on_error_enabled = True
@@ -595,10 +613,39 @@ class Sapscript:
             log.error(f"Error setting screenshot directory '{directory}': {e}. Screenshots will be saved to current directory.", exc_info=True)
             self._screenshot_directory = None
 
-    def _take_screenshot(self, filename_prefix: str = "pysap_error") -> Optional[Path]:
-        """Internal method to capture and save a screenshot."""
-        if ImageGrab is None:
-            log.warning("Cannot take screenshot: Pillow library not installed.")
+    @classmethod
+    def _get_screenshot_executor(cls) -> ThreadPoolExecutor:
+        """Returns the shared single-worker executor used to write screenshots, creating it on first use."""
+        if cls._screenshot_executor is None:
+            cls._screenshot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sapscriptwizard_screenshot")
+            atexit.register(cls._wait_for_pending_screenshots)
+        return cls._screenshot_executor
+
+    @classmethod
+    def _wait_for_pending_screenshots(cls) -> None:
+        """Blocks until all queued screenshot writes have finished."""
+        while cls._pending_screenshots:
+            cls._pending_screenshots.popleft().result() # _write_screenshot never raises
+
+    @staticmethod
+    def _write_screenshot(write_func: Callable[[], None], filepath: Path) -> None:
+        """Runs the encode+save step of a screenshot and logs the outcome."""
+        try:
+            write_func()
+            log.info(f"Screenshot saved successfully: {filepath}")
+        except Exception as e:
+            log.exception(f"Error saving screenshot: {e}")
+
+    def _take_screenshot(self, filename_prefix: str = "pysap_error", sync: bool = True) -> Optional[Path]:
+        """
+        Internal method to capture and save a screenshot.
+
+        The screen is always captured synchronously. If sync is False, encoding and
+        writing the PNG is handed to a background thread and the returned path may
+        not exist yet.
+        """
+        if mss is None and ImageGrab is None:
+            log.warning("Cannot take screenshot: neither mss nor Pillow library installed.")
             return None
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
@@ -606,59 +653,77 @@ class Sapscript:
             save_dir = self._screenshot_directory if self._screenshot_directory else Path(".")
             filepath = save_dir.joinpath(filename)
             log.info(f"Attempting to save screenshot to: {filepath}")
-            screenshot = ImageGrab.grab()
-            screenshot.save(filepath)
-            log.info(f"Screenshot saved successfully: {filepath}")
-            return filepath
+            if mss is not None:
+                # mss grabs the raw BGRA buffer and writes the PNG without building a PIL Image
+                if self._mss is None:
+                    self._mss = mss.mss()
+                screenshot = self._mss.grab(self._mss.monitors[0]) # monitors[0] = all monitors combined
+                write_func = lambda: mss.tools.to_png(screenshot.rgb, screenshot.size, output=str(filepath))
+            else:
+                screenshot = ImageGrab.grab()
+                write_func = lambda: screenshot.save(filepath)
         except Exception as e:
-            log.exception(f"Error taking or saving screenshot: {e}")
+            log.exception(f"Error taking screenshot: {e}")
             return None
 
+        if sync:
+            self._write_screenshot(write_func, filepath)
+            return filepath if filepath.exists() else None
+
+        pending = self._pending_screenshots
+        while pending and pending[0].done():
+            pending.popleft()
+        if len(pending) == pending.maxlen:
+            # Too many writes queued - wait for the oldest instead of dropping it
+            pending.popleft().result()
+        pending.append(self._get_screenshot_executor().submit(self._write_screenshot, write_func, filepath))
+        log.debug(f"Screenshot write queued: {filepath}")
+        return filepath
+
     def handle_exception_with_screenshot(self,
                                          exception: Exception, # Keep argument name generic
                                          filename_prefix: str = "pysap_error") -> None:
         """
         Handles an exception by logging it and taking a screenshot if enabled.
         Typically called from an except block.
+
+        Unless screenshots_sync is set, the PNG is written by a background thread
+        so the caller is not blocked by encoding and disk I/O.
         """
         # Log the exception regardless of screenshot setting
         log.error(f"Handling exception: {type(exception).__name__}: {exception}", exc_info=True) # Add stack trace to log
 
         if self._screenshots_on_error_enabled:
             log.info("Taking screenshot because screenshots_on_error is enabled.")
-            self._take_screenshot(filename_prefix=filename_prefix)
+            self._take_screenshot(filename_prefix=filename_prefix, sync=self.screenshots_sync)
         else:
             log.info("Screenshot on error is disabled, skipping capture.")
 
     # --- HistoryEnabled Methods ---
 
-    def disable_history(self) -> bool:
-        """Disables the SAP GUI input history (sets HistoryEnabled=False)."""
-        log.info("Attempting to disable SAP GUI input history...")
+    def set_history_enabled(self, flag: bool) -> bool:
+        """Enables or disables the SAP GUI input history (sets HistoryEnabled)."""
+        log.info(f"Attempting to set SAP GUI input history to {flag}...")
         try:
             self._ensure_com_objects() # Ensure _application exists
-            self._application.HistoryEnabled = False
-            log.info("SAP GUI input history disabled (HistoryEnabled=False).")
+            if self._dispid_history is None:
+                # Resolve once, later calls go straight to Invoke without the name lookup
+                self._dispid_history = self._application._oleobj_.GetIDsOfNames("HistoryEnabled")
+            self._application._oleobj_.Invoke(self._dispid_history, 0, pythoncom.DISPATCH_PROPERTYPUT, 0, bool(flag))
+            log.info(f"SAP GUI input history set (HistoryEnabled={bool(flag)}).")
             return True
         except exceptions.SapGuiComException as e:
-             log.error(f"Failed to disable history (COM object issue): {e}")
+             log.error(f"Failed to set history (COM object issue): {e}")
              return False
         except Exception as e:
             # Catch potential errors setting the property (e.g., read-only?)
-            log.error(f"Error setting HistoryEnabled to False: {e}", exc_info=True)
+            log.error(f"Error setting HistoryEnabled to {flag}: {e}", exc_info=True)
             return False
 
+    def disable_history(self) -> bool:
+        """Disables the SAP GUI input history (sets HistoryEnabled=False)."""
+        return self.set_history_enabled(False)
+
     def enable_history(self) -> bool:
         """Enables the SAP GUI input history (sets HistoryEnabled=True)."""
-        log.info("Attempting to enable SAP GUI input history...")
-        try:
-            self._ensure_com_objects()
-            self._application.HistoryEnabled = True
-            log.info("SAP GUI input history enabled (HistoryEnabled=True).")
-            return True
-        except exceptions.SapGuiComException as e:
-             log.error(f"Failed to enable history (COM object issue): {e}")
-             return False
-        except Exception as e:
-            log.error(f"Error setting HistoryEnabled to True: {e}", exc_info=True)
-            return False
\ No newline at end of file
+        return self.set_history_enabled(True)
@@ -28,10 +28,15 @@ setup(
     package_dir={"": "."},
     install_requires=[
         "pywin32",
-        "pandas",
         "polars",
         "Pillow"
     ],
+    extras_require={
+        "pandas": ["pandas>=2.0", "pyarrow"],
+        "fast-screenshots": ["mss"],
+        "fast-json": ["orjson"],
+        "msgpack": ["msgpack"],
+    },
     python_requires=">=3.8",
     include_package_data=True,
     classifiers=[
@@ -1,16 +1,50 @@
 """Abstraction over SAP shell tables (ALV grid)"""
-from typing import Self, Any, ClassVar, overload, Union, Dict, List # Добавлено Union
+from typing import Self, Any, ClassVar, overload, Union, Dict, List, Optional, Tuple, Iterator, TYPE_CHECKING # Добавлено Union
 # --- НОВЫЙ КОД ---
 from pathlib import Path # Добавлено для to_csv
+import io
+import os
+from itertools import groupby
 # --- КОНЕЦ НОВОГО КОДА ---
 
+import pythoncom
+import win32clipboard
+import win32con
 import win32com.client
 from win32com.universal import com_error
 import polars as pl
-import pandas
+
+if TYPE_CHECKING:
+    import pandas # Imported lazily in to_pandas_dataframe()
 
 from sapscriptwizard.types_ import exceptions
 
+_ROW_BUFFER_SIZE = 8192 # Rows converted per batch when iterating a table
+
+
+def _format_row_ranges(indexes: List[int]) -> str:
+    """
+    Formats row indexes for GuiGridView.SelectedRows, collapsing consecutive runs
+    into "start-end" ranges so large contiguous selections stay short.
+    """
+    parts = []
+    for _, run in groupby(enumerate(sorted(set(indexes))), key=lambda pair: pair[1] - pair[0]):
+        run = [index for _, index in run]
+        if len(run) > 2:
+            parts.append(f"{run[0]}-{run[-1]}")
+        else:
+            parts.extend(map(str, run))
+    return ",".join(parts)
+
+
+def _iter_rows(data: pl.DataFrame, named: bool) -> Iterator[Any]:
+    """ Row iterator that lets polars convert rows in batches instead of one data.row() call per row. """
+    try:
+        return data.iter_rows(named=named, buffer_size=_ROW_BUFFER_SIZE)
+    except TypeError:
+        # Older polars without buffer_size
+        return data.iter_rows(named=named)
+
 
 class ShellTable:
     """
@@ -18,18 +52,25 @@ class ShellTable:
     Provides methods to read data and interact with the table.
     """
 
-    def __init__(self, session_handle: win32com.client.CDispatch, element: str, load_table: bool = True) -> None:
+    def __init__(self, session_handle: win32com.client.CDispatch, element: str, load_table: bool = True,
+                 clipboard_function_code: Optional[str] = None) -> None:
         """
         Args:
             session_handle (win32com.client.CDispatch): SAP session handle
             element (str): SAP table element ID (usually a GuiShell of subtype GridView)
             load_table (bool): Loads table by scrolling if True, default True
+            clipboard_function_code (Optional[str]): Function code of the grid's context menu item
+                that copies the selection to the clipboard. If set, the whole table is read in one
+                go via SelectAll + clipboard instead of cell by cell (overwrites the clipboard).
+                Falls back to the per-cell read if the clipboard contents don't match the grid.
 
         Raises:
             ActionException: error reading table data or wrong element type.
         """
         self.table_element = element
         self._session_handle = session_handle
+        self._clipboard_function_code = clipboard_function_code
+        self._columns: Optional[Tuple[str, ...]] = None # ColumnOrder, filled by _get_columns()
         try:
             # --- ДОБАВЛЕНИЕ: Проверка типа элемента ---
             self._com_object = self._session_handle.findById(self.table_element)
@@ -43,11 +84,27 @@ class ShellTable:
         except Exception as e:
              raise exceptions.ElementNotFoundException(f"Error finding element '{element}': {e}")
 
+        try:
+            self._session_id = self._session_handle.Info.SystemSessionId
+        except Exception:
+            self._session_id = None # Hash then falls back to the element ID only
+        self._bind_dispids()
         self.data = self._read_shell_table(load_table)
         self.rows = self.data.shape[0]
         self.columns = self.data.shape[1]
 
 
+    @property
+    def data(self) -> pl.DataFrame:
+        """ Table data as a polars DataFrame """
+        return self._data
+
+    @data.setter
+    def data(self, value: pl.DataFrame) -> None:
+        self._data = value
+        # Column name -> position, used by cell(); rebuilt whenever the data is replaced
+        self._col_index = {name: i for i, name in enumerate(value.columns)}
+
     def __repr__(self) -> str:
         # Limit representation size for large tables
         with pl.Config(tbl_rows=10, tbl_cols=8):
@@ -61,15 +118,15 @@ class ShellTable:
     # --- ИЗМЕНЕНИЕ: __eq__ должен сравнивать данные, а не объекты ---
     def __eq__(self, other: object) -> bool:
         if isinstance(other, ShellTable):
-             # Use polars DataFrame equality check
-             try:
-                  return self.data.equals(other.data)
-             except Exception: # Catch potential errors during comparison
+             other = other.data
+        if isinstance(other, pl.DataFrame):
+             # Cheap metadata checks first, so mismatches don't walk the column data
+             if self.data.shape != other.shape or self.data.columns != other.columns:
                   return False
-        elif isinstance(other, pl.DataFrame):
+             # Use polars DataFrame equality check
              try:
                   return self.data.equals(other)
-             except Exception:
+             except Exception: # Catch potential errors during comparison
                   return False
         # Comparing with pandas DataFrame might be needed, but requires conversion
         # elif isinstance(other, pandas.DataFrame):
@@ -81,9 +138,9 @@ class ShellTable:
     # --- КОНЕЦ ИЗМЕНЕНИЯ ---
 
     def __hash__(self) -> hash:
-        # Hashing a DataFrame is problematic. Hash based on shape and element ID for basic identity.
-        # Note: This might not be ideal if data changes. Consider if hashability is truly needed.
-        return hash((self._session_handle.SessionInfo.SystemSessionId, self.table_element, self.data.shape))
+        # Hashing a DataFrame is problematic. Hash based on session and element ID for basic identity.
+        # Session ID is resolved once in __init__, so hashing makes no COM calls.
+        return hash((self._session_id, self.table_element))
 
     # ... (существующие методы __getitem__, __iter__, _read_shell_table, etc.) ...
     # Копируем существующие методы для контекста
@@ -111,17 +168,57 @@ class ShellTable:
             raise TypeError("Table indices must be integers or slices")
 
     def __iter__(self) -> Self:
-        # Reset index for iteration if needed, or rely on iterator class state
-        self._iterator_index = 0
+        # Restart iteration; rows are materialized in buffered batches by polars
+        self._row_iterator = _iter_rows(self.data, named=True)
         return self # Or return ShellTableRowIterator(self.data) if using separate iterator class
 
     def __next__(self) -> Dict[str, Any]:
         # Simple iterator implementation directly in the class
-        if self._iterator_index >= self.rows:
-            raise StopIteration
-        value = self.data.row(self._iterator_index, named=True)
-        self._iterator_index += 1
-        return value
+        return next(self._row_iterator)
+
+    def iter_rows_as_tuples(self) -> Iterator[Tuple[Any, ...]]:
+        """
+        Iterates over rows as tuples in column order (see get_column_names()).
+        Faster than iterating the table itself, as no dict is built per row.
+        """
+        return _iter_rows(self.data, named=False)
+
+    def _bind_dispids(self) -> None:
+        """
+        Resolves DISPIDs of the hot COM members once, so reads can call Invoke directly
+        instead of going through late-bound name lookup on every access.
+        Falls back to regular attribute access (None) if the names cannot be resolved.
+        """
+        try:
+            oleobj = self._com_object._oleobj_
+            self._dispid_rowcount = oleobj.GetIDsOfNames("RowCount")
+            self._dispid_getcellvalue = oleobj.GetIDsOfNames("GetCellValue")
+        except Exception:
+            self._dispid_rowcount = None
+            self._dispid_getcellvalue = None
+
+    def _get_row_count(self) -> int:
+        """ Reads RowCount via its cached DISPID if available. """
+        if self._dispid_rowcount is None:
+            return self._com_object.RowCount
+        return self._com_object._oleobj_.Invoke(self._dispid_rowcount, 0, pythoncom.DISPATCH_PROPERTYGET, True)
+
+    def _get_columns(self) -> Tuple[str, ...]:
+        """ Returns the grid's column IDs (ColumnOrder), enumerated once and cached. """
+        if self._columns is None:
+            columns = self._com_object.ColumnOrder
+            if not isinstance(columns, (list, tuple)):
+                 # ColumnOrder is a COM collection - iterate it via its enumerator (one call)
+                 try:
+                      columns = tuple(columns)
+                 except Exception:
+                      # Collection without a usable enumerator - fall back to Item/Count
+                      try:
+                           columns = tuple(columns.Item(i) for i in range(columns.Count))
+                      except Exception:
+                          raise exceptions.ActionException(f"Could not interpret ColumnOrder for {self.table_element}")
+            self._columns = tuple(columns)
+        return self._columns
 
     def _read_shell_table(self, load_table: bool = True) -> pl.DataFrame:
         """ Reads table data from the GuiShell/GuiGridView element. """
@@ -129,14 +226,7 @@ class ShellTable:
             # Use the stored COM object
             shell = self._com_object # self._session_handle.findById(self.table_element)
 
-            columns = shell.ColumnOrder
-            # Check if columns is a tuple/list or needs conversion
-            if not isinstance(columns, (list, tuple)):
-                 # Handle cases where ColumnOrder might return a COM collection
-                 try:
-                      columns = [columns.Item(i) for i in range(columns.Count)]
-                 except Exception:
-                     raise exceptions.ActionException(f"Could not interpret ColumnOrder for {self.table_element}")
+            columns = self._get_columns()
 
             if not columns:
                  print(f"Warning: No columns found for table {self.table_element}. Returning empty DataFrame.")
@@ -145,43 +235,145 @@ class ShellTable:
             # Get row count *after* potential loading
             if load_table:
                 self.load() # Use the instance's load method
-                # Re-fetch row count after loading
-                rows_count = shell.RowCount
-            else:
-                 rows_count = shell.RowCount
+            rows_count = self._get_row_count()
 
             if rows_count == 0:
                 return pl.DataFrame()
 
+            if self._clipboard_function_code:
+                clipboard_data = self._read_via_clipboard(columns, rows_count)
+                if clipboard_data is not None:
+                    return clipboard_data
+
             # Efficient data reading (consider batching if very large)
-            data = []
-            for i in range(rows_count):
-                row_data = {}
-                for column in columns:
+            # Call GetCellValue through its cached DISPID to skip per-call name resolution
+            if self._dispid_getcellvalue is not None:
+                invoke = shell._oleobj_.Invoke
+                dispid = self._dispid_getcellvalue
+                get_cell_value = lambda row, col: invoke(dispid, 0, pythoncom.DISPATCH_METHOD, True, row, col)
+            else:
+                get_cell_value = shell.GetCellValue
+            # Build column lists directly (polars is columnar), instead of a list of row dicts
+            row_range = range(rows_count)
+            col_data = {}
+            for column in columns:
+                try:
+                    # Fast path: whole column in one comprehension, no per-cell try/except overhead
+                    col_data[column] = [get_cell_value(i, column) for i in row_range]
+                    continue
+                except Exception:
+                    pass
+                # Some cell failed - re-read this column cell by cell so only the failing cells are None
+                values = [None] * rows_count
+                for i in row_range:
                     try:
-                        row_data[column] = shell.GetCellValue(i, column)
+                        values[i] = get_cell_value(i, column)
                     except Exception as cell_ex:
-                         # Log error for specific cell, maybe put None or error string
+                         # Log error for specific cell, cell stays None
                          print(f"Warning: Error reading cell ({i}, {column}): {cell_ex}")
-                         row_data[column] = None # Or some error marker
-                data.append(row_data)
+                col_data[column] = values
 
-            # Handle potential empty data list
-            if not data:
-                 return pl.DataFrame({col:[] for col in columns})
-
-            return pl.DataFrame(data, schema={col:pl.Utf8 for col in columns}) # Assume string initially
+            # Explicit schema keeps Utf8 even for columns where every read failed (all None)
+            return pl.DataFrame(col_data, schema={col:pl.Utf8 for col in columns}) # Assume string initially
 
         except Exception as ex:
             raise exceptions.ActionException(f"Error reading element {self.table_element}: {ex}")
 
-    def to_polars_dataframe(self) -> pl.DataFrame:
-        """ Get table data as a polars DataFrame """
-        return self.data.clone() # Return a copy
+    def _read_via_clipboard(self, columns: Tuple[str, ...], rows_count: int) -> Optional[pl.DataFrame]:
+        """
+        Reads the whole grid with a single copy-to-clipboard round-trip.
+        Returns None if the grid doesn't support it or the copied text doesn't match its shape.
+        """
+        shell = self._com_object
+        try:
+            win32clipboard.OpenClipboard()
+            try:
+                win32clipboard.EmptyClipboard() # Don't pick up stale data if the copy silently fails
+            finally:
+                win32clipboard.CloseClipboard()
+
+            previous_rows = shell.SelectedRows # SelectAll changes the user-visible selection
+            try:
+                shell.SelectAll()
+                shell.ContextMenu()
+                shell.SelectContextMenuItem(self._clipboard_function_code)
+
+                win32clipboard.OpenClipboard()
+                try:
+                    text = win32clipboard.GetClipboardData(win32con.CF_UNICODETEXT)
+                finally:
+                    win32clipboard.CloseClipboard()
+            finally:
+                self._restore_selection(previous_rows)
+        except Exception as e:
+            print(f"Warning: Clipboard read of {self.table_element} failed, reading cell by cell: {e}")
+            return None
+
+        return self._parse_clipboard_text(text, columns, rows_count)
+
+    def _parse_clipboard_text(self, text: str, columns: Tuple[str, ...], rows_count: int) -> Optional[pl.DataFrame]:
+        """
+        Parses the tab-separated text copied from the grid.
+        Returns None if it can't be parsed or doesn't match the grid's shape.
+        """
+        if not text:
+            return None
+        try:
+            data = pl.read_csv(io.StringIO(text), separator="\t", has_header=False,
+                               infer_schema_length=0, quote_char=None) # infer_schema_length=0 -> all Utf8
+        except Exception as e:
+            # Ragged lines (e.g. a tab inside a cell value) - polars raises ComputeError
+            print(f"Warning: Clipboard contents of {self.table_element} could not be parsed: {e}. "
+                  f"Reading cell by cell.")
+            return None
+        if data.shape[0] == rows_count + 1:
+            data = data.slice(1) # Copy included the column titles
+        if data.shape != (rows_count, len(columns)):
+            print(f"Warning: Clipboard contents of {self.table_element} have shape {data.shape}, "
+                  f"expected {(rows_count, len(columns))}. Reading cell by cell.")
+            return None
+        # GetCellValue returns "" for empty cells, keep the same representation
+        return data.rename(dict(zip(data.columns, columns))).fill_null("")
+
+    def _restore_selection(self, selected_rows: str) -> None:
+        """ Puts back the row selection saved before a clipboard read (clears it if nothing was selected). """
+        try:
+            if selected_rows:
+                self._com_object.SelectedRows = selected_rows
+            else:
+                self._com_object.ClearSelection()
+        except Exception as e:
+            print(f"Warning: Could not restore the selection of {self.table_element}: {e}")
+
+    def to_polars_dataframe(self, copy: bool = False) -> pl.DataFrame:
+        """
+        Get table data as a polars DataFrame
+
+        Args:
+            copy (bool): Return a clone instead of the table's own frame. Polars operations
+                         return new frames anyway, so this is rarely needed. Defaults to False.
+        """
+        return self.data.clone() if copy else self.data
+
+    def to_pandas_dataframe(self, zero_copy: bool = True) -> "pandas.DataFrame":
+        """
+        Get table data as a pandas DataFrame
+
+        Args:
+            zero_copy (bool): If True (default), the columns are Arrow-backed (pandas.ArrowDtype)
+                              and share the polars buffers instead of being copied into numpy
+                              arrays, which roughly halves peak memory on large tables.
+                              Set to False for classic numpy/object-backed columns.
+        """
+        try:
+            import pandas # Only needed here - keeps pandas out of the module import time
+        except ImportError as e:
+            raise ImportError("to_pandas_dataframe() requires pandas. Install with: pip install sapscriptwizard[pandas]") from e
 
-    def to_pandas_dataframe(self) -> pandas.DataFrame:
-        """ Get table data as a pandas DataFrame """
-        return self.data.to_pandas()
+        if not zero_copy:
+            return self.data.to_pandas()
+        # self_destruct only releases the temporary Arrow table, the polars frame keeps its own references
+        return self.data.to_arrow().to_pandas(types_mapper=pandas.ArrowDtype, self_destruct=True, split_blocks=True)
 
     def to_dict(self, as_series: bool = False) -> Dict[str, Any]:
         """ Get table data as a dictionary """
@@ -204,8 +396,15 @@ class ShellTable:
 
     def cell(self, row: int, column: Union[str, int]) -> Any:
         """ Get cell value from the DataFrame """
+        if isinstance(column, str):
+            # Resolve the name through the cached index instead of a polars name lookup per call
+            column_index = self._col_index.get(column)
+            if column_index is None:
+                raise KeyError(f"Column '{column}' not found.")
+        else:
+            column_index = column
         try:
-            return self.data.item(row, column)
+            return self.data.item(row, column_index)
         except IndexError:
              raise IndexError(f"Row index {row} out of bounds.")
         except pl.ColumnNotFoundError:
@@ -213,58 +412,51 @@ class ShellTable:
         except Exception as e:
              raise RuntimeError(f"Error accessing cell ({row}, {column}): {e}")
 
+    def get_cell_fast(self, row: int, column_index: int) -> Any:
+        """
+        Get cell value by row and column position without the error translation done by cell().
+        Meant for tight loops; polars exceptions propagate as is.
+        """
+        return self._data.item(row, column_index)
+
     def load(self, move_by: int = 20, move_by_table_end: int = 2) -> None:
-        """ Skims through the table to load all data, as SAP only loads visible data """
+        """
+        Skims through the table to load all data, as SAP only loads visible data.
+
+        Scrolls by move_by rows. Positions are clamped to the last row, so the end of the
+        table is detected from RowCount instead of a COM error past the boundary.
+        If RowCount still grows once the end is reached, scrolling continues by
+        move_by_table_end rows until it stops growing.
+        """
         row_position = 0
         try:
             shell = self._com_object # Use stored object
+            visible_row_count = shell.VisibleRowCount # Does not change while scrolling
+            step = move_by
 
-            # Scroll down quickly first
             while True:
                 try:
+                    row_count = self._get_row_count()
+                    if row_count == 0:
+                        break
+                    if row_position >= row_count - visible_row_count: # Last page reached
+                        # Setting currentCellRow to the very last row loads the final page
+                        shell.currentCellRow = row_count - 1
+                        if self._get_row_count() <= row_count:
+                            break # Nothing more was loaded - done
+                        # More rows appeared: continue slowly from where we are
+                        row_position = row_count - 1
+                        step = move_by_table_end
+                        continue
                     # Setting currentCellRow might be enough to trigger loading
                     shell.currentCellRow = row_position
-                    # Optional: Verify if data actually loaded or add a small sleep
-                    # sleep(0.05)
-                    if row_position >= shell.RowCount - shell.VisibleRowCount: # Stop near the end
-                         break
-                except com_error as ce:
-                    # Check if error code indicates "out of bounds" or similar benign error at the end
-                    # HRESULT for "invalid row number" might vary. Check specific error.
-                    # For now, just break on any COM error during fast scroll.
-                    # print(f"COM error during fast scroll at row {row_position}: {ce}. Assuming end reached.")
+                except com_error:
+                    # Should not happen with clamped positions; treat it as the end of the table
                     break
                 except Exception as e:
-                     print(f"Warning: Unexpected error during fast scroll at row {row_position}: {e}. Stopping scroll.")
+                     print(f"Warning: Unexpected error during scroll at row {row_position}: {e}. Stopping scroll.")
                      break # Stop on unexpected errors
-                row_position += move_by
-
-            # Scroll slowly near the end to catch final rows
-            # Start from slightly before the last known position
-            row_position = max(0, row_position - move_by)
-            final_row_count = shell.RowCount # Get current count before slow scroll
-            while row_position < final_row_count: # Scroll until the current end
-                 try:
-                     shell.currentCellRow = row_position
-                     # sleep(0.05)
-                     # Update final_row_count in case more rows load during slow scroll
-                     new_row_count = shell.RowCount
-                     if new_row_count > final_row_count:
-                         final_row_count = new_row_count
-                 except com_error:
-                     # Benign error expected when trying to set currentCellRow past the actual end
-                     # print(f"COM error during slow scroll at row {row_position}. Reached end.")
-                     break
-                 except Exception as e:
-                      print(f"Warning: Unexpected error during slow scroll at row {row_position}: {e}. Stopping scroll.")
-                      break
-                 row_position += move_by_table_end
-
-            # One final scroll to the very last row might be needed
-            try:
-                 shell.currentCellRow = max(0, shell.RowCount - 1)
-            except Exception:
-                 pass # Ignore errors setting to the very last row
+                row_position += step
 
         except Exception as e:
             # Don't raise ActionException, just print warning, as reading might still work partially
@@ -282,8 +474,8 @@ class ShellTable:
     def select_rows(self, indexes: List[int]) -> None:
         """ Selects rows in the shell table by their 0-based indexes """
         try:
-            # Convert list of integers to comma-separated string
-            value = ",".join(map(str, indexes))
+            # Convert list of integers to SAP's selection syntax, e.g. "0,3-250,300"
+            value = _format_row_ranges(indexes)
             self._com_object.selectedRows = value
         except Exception as e:
             raise exceptions.ActionException(
@@ -303,14 +495,15 @@ class ShellTable:
     # --- НОВЫЙ КОД: Сохранение в CSV ---
     def to_csv(self, file_path: Union[str, Path], separator: str = ';', include_header: bool = True, **kwargs) -> None:
         """
-        Saves the table data to a CSV file using polars.
+        Saves the table data to a CSV file using polars' streaming CSV sink.
 
         Args:
             file_path (Union[str, Path]): The path to the output CSV file.
             separator (str): The delimiter to use in the CSV file. Defaults to ';'.
             include_header (bool): Whether to write the header row. Defaults to True.
-            **kwargs: Additional keyword arguments passed directly to polars.DataFrame.write_csv().
-                      See Polars documentation for options like encoding, date_format, etc.
+            **kwargs: Additional keyword arguments passed directly to polars.LazyFrame.sink_csv()
+                      (or polars.DataFrame.write_csv() on fallback). See Polars documentation for
+                      options like date_format, batch_size (defaults to 4096 here), etc.
         """
         try:
             # Ensure directory exists if file_path includes directories
@@ -318,12 +511,25 @@ class ShellTable:
             path_obj.parent.mkdir(parents=True, exist_ok=True)
 
             print(f"Saving table data to CSV: {path_obj.resolve()}")
-            self.data.write_csv(
-                file=path_obj,
-                separator=separator,
-                include_header=include_header,
-                **kwargs
-            )
+            file_str = os.fspath(path_obj)
+            kwargs.setdefault("batch_size", 4096) # Larger batches -> fewer, bigger writes
+            try:
+                # Streaming sink writes batch by batch instead of encoding the whole table first
+                self.data.lazy().sink_csv(
+                    file_str,
+                    separator=separator,
+                    include_header=include_header,
+                    **kwargs
+                )
+            except Exception as sink_ex:
+                # Older polars versions (or unsupported kwargs) - use the eager writer
+                print(f"Warning: sink_csv failed ({sink_ex}), falling back to write_csv.")
+                self.data.write_csv(
+                    file=file_str,
+                    separator=separator,
+                    include_header=include_header,
+                    **kwargs
+                )
             print("Save to CSV complete.")
         except Exception as e:
             raise exceptions.ActionException(f"Error saving table {self.table_element} to CSV '{file_path}': {e}")
@@ -334,13 +540,12 @@ class ShellTableRowIterator:
     def __init__(self, data: pl.DataFrame) -> None:
         self.data = data
         self.index = 0
+        self._rows = _iter_rows(data, named=True)
 
     def __iter__(self) -> Self:
         return self
 
     def __next__(self) -> Dict[str, Any]:
-        if self.index >= self.data.shape[0]:
-            raise StopIteration
-        value = self.data.row(self.index, named=True)
+        value = next(self._rows)
         self.index += 1
         return value
\ No newline at end of file
@@ -0,0 +1,29 @@
+"""Tests for ShellTable clipboard parsing (no SAP GUI connection needed)."""
+import pytest
+
+pytest.importorskip("win32clipboard") # pywin32: Windows only
+pl = pytest.importorskip("polars")
+
+from sapscriptwizard.shell_table import ShellTable
+
+
+def _table() -> ShellTable:
+    table = ShellTable.__new__(ShellTable) # Skip __init__: it reads the grid over COM
+    table.table_element = "wnd[0]/usr/cntlGRID/shellcont/shell"
+    return table
+
+
+def test_parse_clipboard_text_matching_shape():
+    data = _table()._parse_clipboard_text("a\tb\r\nc\td\r\n", ("COL1", "COL2"), 2)
+    assert data is not None
+    assert data.columns == ["COL1", "COL2"]
+    assert data.rows() == [("a", "b"), ("c", "d")]
+
+
+def test_parse_clipboard_text_ragged_returns_none():
+    # A tab inside a cell value gives a line with more fields than the first one
+    assert _table()._parse_clipboard_text("a\tb\r\nc\td\te\r\n", ("COL1", "COL2"), 2) is None
+
+
+def test_parse_clipboard_text_wrong_shape_returns_none():
+    assert _table()._parse_clipboard_text("a\tb\r\n", ("COL1", "COL2"), 2) is None
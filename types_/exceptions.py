@@ -3,51 +3,74 @@
 
 class WindowDidNotAppearException(Exception):
     """Main windows didn't show up - possible pop-up window"""
+    __slots__ = ()
 
 
 class AttachException(Exception):
     """Error with attaching - connection or session"""
+    __slots__ = ()
 
 
 class ActionException(Exception):
     """Error performing action - click, select ..."""
+    __slots__ = ()
 
 
 class SapGuiComException(Exception):
     """Error interacting with SAP GUI COM object"""
+    __slots__ = ()
+
+    def __str__(self) -> str:
+        # logging-style args ("... %s ...", arg): the message is only formatted when shown
+        if len(self.args) > 1 and isinstance(self.args[0], str):
+            try:
+                return self.args[0] % self.args[1:]
+            except (TypeError, ValueError):
+                pass
+        return super().__str__()
 
 class ElementNotFoundException(SapGuiComException):
     """GUI element not found by ID"""
+    __slots__ = ()
 
 # --- НОВЫЙ КОД ---
 class PropertyNotFoundException(SapGuiComException):
     """Element does not have the requested property"""
+    __slots__ = ()
 
 class InvalidElementTypeException(SapGuiComException):
     """Element is not of the expected type for the operation"""
+    __slots__ = ()
 # --- КОНЕЦ НОВОГО КОДА ---
 
 
 class MenuNotFoundException(ElementNotFoundException):
     """Menu item not found by name"""
+    __slots__ = ()
 
 class StatusBarException(SapGuiComException):
     """Error reading status bar"""
+    __slots__ = ()
 
 class TransactionException(Exception):
     """Base exception for transaction errors"""
+    __slots__ = ()
 
 class TransactionNotFoundError(TransactionException):
     """Transaction code does not exist"""
+    __slots__ = ()
 
 class AuthorizationError(TransactionException):
     """User not authorized for the transaction or action"""
+    __slots__ = ()
 
 class ActionBlockedError(TransactionException):
     """Action blocked within the transaction (e.g., locked object)"""
+    __slots__ = ()
 
 class SapLogonConfigError(Exception):
     """Error related to saplogon.ini configuration"""
+    __slots__ = ()
 class StatusBarAssertionError(SapGuiComException):
      """Raised when status bar content does not match expectations."""
-     pass
+     __slots__ = ()
@@ -1,14 +1,97 @@
 # --- НОВЫЙ ФАЙЛ: pysapscript\utils\sap_config.py ---
 """Utilities for reading saplogon.ini configuration files."""
-import configparser
+import functools
 import os
+import stat
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Union, List, Optional
+from typing import Callable, Dict, Union, List, Optional
 
 from sapscriptwizard.types_.exceptions import SapLogonConfigError
 
 DESCRIPTION_SECTION = "Description"
 SID_SECTION = "MSSysName"
+# С этого количества файлов ini читаются параллельно (чтение с диска, GIL не мешает)
+_PARALLEL_READ_MIN_FILES = 3
+_PARALLEL_READ_MAX_WORKERS = 8
+_NO_INI_FILES_MESSAGE = "No saplogon.ini files have been set using set_ini_files()."
+
+# Last parsed version (mtime_ns) per ini path: files whose current version is here are answered
+# from the lru caches inline, only the rest go to the thread pool
+_parsed_versions: Dict[str, int] = {}
+# Shared by all lookups, created on first need (a new pool per call costs more than cached lookups)
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Returns the module-wide thread pool for ini reads, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_PARALLEL_READ_MAX_WORKERS,
+                                               thread_name_prefix="saplogon-ini")
+    return _executor
+
+def _read_sections(path_str: str) -> Dict[str, Dict[str, str]]:
+    """
+    Minimal saplogon.ini reader: returns only the Description and MSSysName sections
+    as {key: value} dicts. Keys are lower-cased like configparser does.
+    Much cheaper than configparser for this fixed key=value format.
+    """
+    sections: Dict[str, Dict[str, str]] = {DESCRIPTION_SECTION: {}, SID_SECTION: {}}
+    current: Optional[Dict[str, str]] = None
+    # saplogon.ini is usually latin-1 encoded
+    with open(path_str, 'rb') as f:
+        text = f.read().decode('latin-1')
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line[0] in ';#':
+            continue # Empty line or comment
+        if line[0] == '[' and line[-1] == ']':
+            current = sections.get(line[1:-1])
+        elif current is not None:
+            key, sep, value = line.partition('=')
+            if sep:
+                current.setdefault(key.strip().lower(), value.strip())
+    return sections
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_ini(path_str: str, mtime_ns: int) -> Dict[str, str]:
+    """
+    Parses a saplogon.ini file into a {SID (upper case): connection name} mapping.
+    mtime_ns is only part of the cache key, so an edited file gets parsed again.
+    """
+    sections = _read_sections(path_str)
+    _parsed_versions[path_str] = mtime_ns
+    descriptions = sections[DESCRIPTION_SECTION]
+
+    connections: Dict[str, str] = {}
+    seen_sids = set()
+    for key, value in sections[SID_SECTION].items():
+        sid_upper = value.upper()
+        if sid_upper in seen_sids:
+            continue # Only the first entry for a SID counts
+        seen_sids.add(sid_upper)
+        if key in descriptions:
+            connections[sid_upper] = descriptions[key]
+    return connections
+
+
+@functools.lru_cache(maxsize=1024)
+def _resolve_sid(path_str: str, mtime_ns: int, sid_upper: str) -> Optional[str]:
+    """Returns the connection name for sid_upper in one ini file version, or None."""
+    return _parse_ini(path_str, mtime_ns).get(sid_upper)
+
+
+def _resolve_sid_in_file(file_path: Path, sid_upper: str) -> Optional[str]:
+    """Looks sid_upper up in the current version of file_path (safe to run in a worker thread)."""
+    # Cached per file version; mtime_ns in the cache key invalidates edited files
+    return _resolve_sid(str(file_path), file_path.stat().st_mtime_ns, sid_upper)
+
 
 class SapLogonConfig:
     """
@@ -16,12 +99,16 @@ class SapLogonConfig:
     Based on SAPLogonINI from pysapgui.
     """
     _instance = None
+    _instance_lock = threading.Lock()
     _ini_files: List[Path] = []
+    _ini_count = 0 # len(_ini_files), kept in sync by set_ini_files
 
     def __new__(cls, *args, **kwargs):
         # Singleton pattern to hold ini file paths globally if needed
-        if not cls._instance:
-            cls._instance = super(SapLogonConfig, cls).__new__(cls)
+        if not cls._instance: # Fast path without the lock
+            with cls._instance_lock:
+                if not cls._instance: # Re-check, another thread may have created it meanwhile
+                    cls._instance = super(SapLogonConfig, cls).__new__(cls)
         return cls._instance
 
     def set_ini_files(self, *file_paths: Union[str, Path]) -> None:
@@ -31,14 +118,22 @@ class SapLogonConfig:
         Args:
             *file_paths (Union[str, Path]): One or more paths to saplogon.ini files.
         """
-        self._ini_files = []
+        ini_files = []
         for file_path in file_paths:
             path = Path(file_path)
-            if path.exists() and path.is_file():
-                self._ini_files.append(path.resolve())
+            try:
+                is_file = stat.S_ISREG(path.stat().st_mode) # One stat instead of exists() + is_file()
+            except OSError:
+                is_file = False
+            if is_file:
+                ini_files.append(path.resolve())
             else:
                 # Optionally raise an error or log a warning
                 print(f"Warning: saplogon.ini file not found or is not a file: {path}")
+        # Swap in the complete list at once, so concurrent lookups never see a partial one
+        with self._instance_lock:
+            self._ini_files = ini_files
+            self._ini_count = len(ini_files)
 
     def get_connect_name_by_sid(self, sid: str, first_only: bool = True) -> Optional[Union[str, List[str]]]:
         """
@@ -55,46 +150,67 @@ class SapLogonConfig:
         Raises:
             SapLogonConfigError: If no ini files were set or if SID is not found.
         """
-        if not self._ini_files:
-            raise SapLogonConfigError("No saplogon.ini files have been set using set_ini_files().")
+        if self._ini_count == 0:
+            raise SapLogonConfigError(_NO_INI_FILES_MESSAGE)
 
-        found_names: List[str] = []
         sid_upper = sid.upper()
 
-        for file_path in self._ini_files:
-            config = configparser.ConfigParser()
+        ini_files = self._ini_files
+        lookups: List[Callable[[], Optional[str]]] = []
+        uncached: List[int] = [] # Files whose current version is not parsed yet
+        for i, file_path in enumerate(ini_files):
+            path_str = str(file_path)
             try:
-                # Use 'utf-8' or 'latin-1' encoding, common for saplogon.ini
-                config.read(file_path, encoding='latin-1')
+                mtime_ns = file_path.stat().st_mtime_ns
+            except OSError:
+                # The lookup repeats the stat and reports the error in file order
+                lookups.append(functools.partial(_resolve_sid_in_file, file_path, sid_upper))
+                continue
+            lookups.append(functools.partial(_resolve_sid, path_str, mtime_ns, sid_upper))
+            if _parsed_versions.get(path_str) != mtime_ns:
+                uncached.append(i)
+
+        futures: List[Future] = []
+        if len(uncached) >= _PARALLEL_READ_MIN_FILES:
+            # Read files that are not cached yet concurrently; results are still consumed in file order below
+            executor = _get_executor()
+            for i in uncached:
+                future = executor.submit(lookups[i])
+                futures.append(future)
+                lookups[i] = future.result
+
+        try:
+            found_names = self._collect_names(ini_files, lookups, first_only)
+        finally:
+            for future in futures:
+                future.cancel() # Early hit: pending reads are not needed anymore
 
-                if SID_SECTION not in config or DESCRIPTION_SECTION not in config:
-                    continue # Skip files without the required sections
+        if not found_names:
+            # Raise error only after checking all files
+            raise SapLogonConfigError(f"System ID '{sid}' not found in configured saplogon.ini files.")
+        else:
+            return found_names if not first_only else found_names[0]
 
-                items = dict(config[SID_SECTION].items())
-                item_id = None
-                for key, value in items.items():
-                    if value.upper() == sid_upper:
-                        item_id = key
-                        break
+    @staticmethod
+    def _collect_names(ini_files: List[Path], lookups: List[Callable[[], Optional[str]]],
+                       first_only: bool) -> List[str]:
+        """Runs the lookups in file order; stops at the first match if first_only is set."""
+        found_names: List[str] = []
+        seen = set() # Membership check for found_names, the list keeps file order
+        for file_path, lookup in zip(ini_files, lookups):
+            try:
+                conn_name = lookup()
 
-                if item_id and item_id in config[DESCRIPTION_SECTION]:
-                    conn_name = config[DESCRIPTION_SECTION][item_id]
+                if conn_name is not None:
                     if first_only:
-                        return conn_name
+                        return [conn_name]
                     else:
-                        if conn_name not in found_names: # Avoid duplicates from same file
+                        if conn_name not in seen: # Avoid duplicates from same file
+                             seen.add(conn_name)
                              found_names.append(conn_name)
 
-            except configparser.Error as e:
-                print(f"Warning: Could not parse {file_path}: {e}")
             except Exception as e:
                  print(f"Warning: An unexpected error occurred reading {file_path}: {e}")
-
-
-        if not found_names:
-            # Raise error only after checking all files
-            raise SapLogonConfigError(f"System ID '{sid}' not found in configured saplogon.ini files.")
-        else:
-            return found_names if not first_only else found_names[0]
+        return found_names
 
 # --- КОНЕЦ НОВОГО ФАЙЛА ---
\ No newline at end of file
@@ -1,12 +1,17 @@
 """High level wrapper around a SAP GUI window."""
-import pprint # Для dump_element_state
-import json
 import time
 from time import sleep
 from pathlib import Path
 import re
-from typing import Tuple, Optional, List, Generator, Any, Union, Dict, Pattern # Добавлено Dict, Optional, Union
+import operator
+import importlib
+import os
+import tempfile
+from collections import OrderedDict, deque
+from typing import Tuple, Optional, List, Generator, Any, Union, Dict, Pattern, Callable, Set, ClassVar, IO, Iterable, Collection, Sequence # Добавлено Dict, Optional, Union
 import logging
+import pythoncom
+import pywintypes
 import win32com.client
 
 from sapscriptwizard.types_ import exceptions
@@ -15,16 +20,491 @@ from sapscriptwizard.shell_table import ShellTable
 # --- НОВЫЙ КОД ---
 from sapscriptwizard.gui_tree import GuiTree # Импорт класса GuiTree
 # --- КОНЕЦ НОВОГО КОДА ---
-try:
-    import yaml
-except ImportError:
-    yaml = None
 from .element_finder import SapElementFinder, DEFAULT_TARGET_TYPES
 
 
 log = logging.getLogger(__name__)
 
+# Сколько найденных через findById элементов держать в кэше окна
+_ID_CACHE_SIZE = 256
+# Сколько разрешенных локаторов (*_by_locator) держать в кэше окна
+_LOCATOR_CACHE_SIZE = 128
+# Свойства строки статуса, которые читает get_status_message (порядок важен)
+_SBAR_PROPERTIES = ("Text", "MessageType", "MessageId", "MessageNumber")
+# Готовые id строки статуса и меню главного окна (самый частый случай)
+_WND0_SBAR = "wnd[0]/sbar"
+_WND0_MBAR = "wnd[0]/mbar"
+# Удаляет '&' (маркер горячей клавиши) из текста пунктов меню
+_AMP_TABLE = str.maketrans("", "", "&")
+# Типы элементов по умолчанию для *_by_locator (кортежи: общий неизменяемый default)
+_PRESS_TYPES = ("GuiButton", "GuiTab")
+_WRITE_TYPES = ("GuiTextField", "GuiCTextField", "GuiPasswordField", "GuiComboBox")
+_READ_TYPES = _WRITE_TYPES + ("GuiLabel",)
+_SELECT_TYPES = ("GuiCheckBox", "GuiRadioButton", "GuiTab", "GuiMenu")
+_IS_SELECTED_TYPES = ("GuiCheckBox", "GuiRadioButton")
+_CHECKBOX_TYPES = ("GuiCheckBox",)
+
+# Важные свойства, которые слепок читает всегда (даже если dir() их не показал)
+_SNAPSHOT_STANDARD_PROPS: Tuple[str, ...] = ('Id', 'Type', 'Name', 'Text', 'Tooltip', 'Changeable', 'ContainerType', 'ScreenLeft', 'ScreenTop', 'Width', 'Height', 'DefaultTooltip', 'IconName', 'ClassName')
+_SNAPSHOT_STANDARD_PROPS_SET = frozenset(_SNAPSHOT_STANDARD_PROPS)
+
+# Необязательные библиотеки (PyYAML, orjson, msgpack) импортируются при первом использовании,
+# а не при импорте модуля. Имя модуля -> модуль или None, если он не установлен
+_optional_modules: Dict[str, Any] = {}
+
+
+def _optional_import(name: str) -> Any:
+    """ Imports an optional dependency on first use; returns None if it is not installed. """
+    if name not in _optional_modules:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            module = None
+        _optional_modules[name] = module
+    return _optional_modules[name]
+
+
+def _orjson_dumps(data: Any) -> Optional[bytes]:
+    """ UTF-8 JSON from orjson (indent 2, default=str), or None if orjson is missing or cannot encode data. """
+    orjson = _optional_import("orjson") # В несколько раз быстрее стандартного json
+    if orjson is None:
+        return None
+    try:
+        return orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        return None # Например, int больше 64 бит - стандартный json справится
+
+
+def _stdlib_json_dumps(data: Any) -> str:
+    import json
+    return json.dumps(data, indent=2, ensure_ascii=False, default=str) # default=str для несериализуемых типов
+
+
+def _json_dumps(data: Any) -> str:
+    """ json.dumps(data, indent=2, ensure_ascii=False, default=str), via orjson when it is available. """
+    encoded = _orjson_dumps(data)
+    return encoded.decode("utf-8") if encoded is not None else _stdlib_json_dumps(data)
+
+
+def _json_dumps_bytes(data: Any) -> bytes:
+    """ Same as _json_dumps, encoded as UTF-8; orjson output is used as-is, without a decode/encode round-trip. """
+    encoded = _orjson_dumps(data)
+    return encoded if encoded is not None else _stdlib_json_dumps(data).encode("utf-8")
+
+
+def _write_json(data: Any, f: IO[bytes]) -> None:
+    f.write(_json_dumps_bytes(data))
+
+
+def _write_yaml(data: Any, f: IO[str]) -> None:
+    # allow_unicode=True важно для не-ASCII символов; строка целиком и одна запись вместо записи по токенам
+    f.write(_optional_import("yaml").dump(data, allow_unicode=True, indent=2, default_flow_style=False, sort_keys=False))
+
+
+def _snapshot_from_events(events: Iterable[Tuple[Any, ...]]) -> Dict[str, Any]:
+    """ Assembles the nested snapshot dict from Window._walk_snapshot events. """
+    root: Dict[str, Any] = {}
+    open_lists: List[List[Dict[str, Any]]] = [] # Списки "Children" открытых элементов
+    for event in events:
+        if event[0] == "open":
+            _, element_data, has_children = event
+            if open_lists:
+                open_lists[-1].append(element_data)
+            else:
+                root = element_data
+            if has_children:
+                children_data: List[Dict[str, Any]] = []
+                element_data["Children"] = children_data
+                open_lists.append(children_data)
+        elif event[1]: # ("close", has_children)
+            open_lists.pop()
+    return root
+
+
+def _write_json_events(events: Iterable[Tuple[Any, ...]], f: IO[bytes]) -> None:
+    """
+    Writes Window._walk_snapshot events to f as JSON while the tree is being walked,
+    so the full snapshot never sits in memory. Output matches _json_dumps of the whole tree.
+    """
+    open_lists: List[bool] = [] # Для каждого открытого "Children": следующий элемент - первый?
+    for event in events:
+        if event[0] == "open":
+            _, element_data, has_children = event
+            indent = b"    " * len(open_lists) # Элемент списка: +2 уровня (ключ "Children" и сам список)
+            if open_lists:
+                f.write(b"\n" + indent if open_lists[-1] else b",\n" + indent)
+                open_lists[-1] = False
+            text = _json_dumps_bytes(element_data).replace(b"\n", b"\n" + indent)
+            if has_children:
+                # Убираем закрывающую скобку: после свойств идет "Children"
+                text = text[:-(len(indent) + 2)] + b",\n" if element_data else b"{\n"
+                text += indent + b'  "Children": ['
+                open_lists.append(True)
+            f.write(text)
+        elif event[1]: # ("close", has_children)
+            open_lists.pop()
+            indent = b"    " * len(open_lists)
+            f.write(b"\n" + indent + b"  ]\n" + indent + b"}")
+
+
+def _guard_snapshot_walk(events: Iterable[Tuple[Any, ...]]) -> Generator[Tuple[Any, ...], None, None]:
+    """ Re-raises errors from the tree walk as SapGuiComException (also when the walk runs inside a writer). """
+    try:
+        yield from events
+    except Exception as e_dump:
+        log.exception("Ошибка во время рекурсивного сбора данных для слепка: %s", e_dump)
+        raise exceptions.SapGuiComException(f"Ошибка сбора данных для слепка: {e_dump}") from e_dump
+
+
+def _write_msgpack(data: Any, f: IO[bytes]) -> None:
+    # Бинарный формат: файл меньше и пишется быстрее, чем JSON/YAML (для машинного сравнения слепков)
+    _optional_import("msgpack").pack(data, f, default=str, use_bin_type=True)
+
+
+# Размер буфера файла слепка (байт)
+_SNAPSHOT_WRITE_BUFFER = 1 << 20
+
+# Формат слепка GUI -> функция записи в открытый файл
+_SNAPSHOT_WRITERS: Dict[str, Callable[[Any, IO[Any]], None]] = {
+    "json": _write_json,
+    "yaml": _write_yaml,
+    "msgpack": _write_msgpack,
+}
+# Форматы, для которых нужна сторонняя библиотека: формат -> (модуль, пакет для pip)
+_SNAPSHOT_FORMAT_DEPENDENCIES: Dict[str, Tuple[str, str]] = {
+    "yaml": ("yaml", "pyyaml"),
+    "msgpack": ("msgpack", "msgpack"),
+}
+# Писатели, которым нужен файл в бинарном режиме (JSON пишется готовыми UTF-8 байтами orjson)
+_BINARY_SNAPSHOT_WRITERS = frozenset({_write_json, _write_json_events, _write_msgpack})
+
+
+def _get_snapshot_writer(output_format: str) -> Callable[[Any, IO[Any]], None]:
+    """ Returns the writer for output_format; raises ValueError for unknown formats or a missing library. """
+    fmt = output_format.lower()
+    writer = _SNAPSHOT_WRITERS.get(fmt)
+    if writer is None:
+        raise ValueError("Неверный output_format. Допустимые значения: 'json', 'yaml', 'msgpack'.")
+    dependency = _SNAPSHOT_FORMAT_DEPENDENCIES.get(fmt)
+    if dependency is not None and _optional_import(dependency[0]) is None:
+        raise ValueError(f"Для формата '{fmt}' необходимо установить библиотеку {dependency[1]}: pip install {dependency[1]}")
+    return writer
+
+
+def _save_snapshot(snapshot_data: Any, filepath: Union[str, Path], writer: Callable[[Any, IO[Any]], None]) -> Path:
+    """
+    Writes snapshot_data to filepath (creating parent dirs) and returns the resolved path.
+    The data goes to a temporary file in the same directory that replaces filepath only
+    after the writer finished: a walk that fails midway (snapshot_data may be a lazy
+    event stream) leaves neither a truncated file nor a lost previous snapshot.
+    """
+    file_path_obj = Path(filepath)
+    try:
+        file_path_obj.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=file_path_obj.parent, prefix=file_path_obj.name + ".", suffix=".tmp")
+        f: Optional[IO[Any]] = None
+        try:
+            # Большой буфер: потоковая запись JSON делает много мелких f.write
+            if writer in _BINARY_SNAPSHOT_WRITERS:
+                f = open(fd, 'wb', buffering=_SNAPSHOT_WRITE_BUFFER)
+            else:
+                f = open(fd, 'w', encoding='utf-8', buffering=_SNAPSHOT_WRITE_BUFFER)
+            with f:
+                writer(snapshot_data, f)
+            os.replace(tmp_name, file_path_obj)
+        except BaseException:
+            if f is None:
+                os.close(fd) # open(fd) не успел забрать дескриптор
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+        return file_path_obj.resolve()
+    except IOError as e_io:
+        log.error("Ошибка записи файла слепка '%s': %s", filepath, e_io)
+        raise
+    except Exception as e_save:
+        log.error("Неожиданная ошибка при сохранении файла слепка '%s': %s", filepath, e_save)
+        raise
+
+
+# Тип "сырого" IDispatch, который возвращает _oleobj_.Invoke для свойств-объектов
+_PyIDispatchType = pythoncom.TypeIIDs[pythoncom.IID_IDispatch]
+# Класс динамической обертки один раз на модуль; проверяем isinstance, а не type() is, чтобы проходили и подклассы
+_CDispatch = win32com.client.CDispatch
+
+
+def _get_com_property(com_object: Any, name: str) -> Any:
+    """
+    Reads a property with a single IDispatch::Invoke, using the DISPID pywin32 already
+    resolved from the type info; other names (methods, objects without type info) go
+    through getattr. Raises AttributeError if the object has no such member, so it
+    replaces the hasattr() + getattr() pair (two property reads) with one.
+    """
+    olerepr = getattr(com_object, "_olerepr_", None)
+    entry = None
+    if olerepr is not None:
+        entry = olerepr.propMapGet.get(name) or olerepr.propMap.get(name)
+    if entry is None:
+        return getattr(com_object, name)
+    return _invoke_property_get(com_object, entry.dispid)
+
+
+def _com_collection_count(value: Any) -> Optional[int]:
+    """
+    Returns Count if value is a COM collection, otherwise None. One Count read
+    replaces the hasattr(value, 'Count') + hasattr(value, 'Item') probes.
+    """
+    if not isinstance(value, _CDispatch):
+        return None
+    try:
+        return _get_com_property(value, "Count")
+    except AttributeError:
+        return None
+
+
+def _invoke_property_get(com_object: Any, dispid: int) -> Any:
+    """ Reads the property with the given DISPID in one IDispatch::Invoke. """
+    value = com_object._oleobj_.Invoke(dispid, 0, pythoncom.DISPATCH_PROPERTYGET, True)
+    if isinstance(value, _PyIDispatchType):
+        value = win32com.client.Dispatch(value) # Как getattr: объект-свойство оборачиваем в CDispatch
+    return value
+
+
+# HRESULT DISP_E_UNKNOWNNAME от GetIDsOfNames: у объекта нет члена с таким именем
+_DISP_E_UNKNOWNNAME = -2147352570
+
+
+def _get_com_property_by_type(com_object: Any, name: str, dispids: Dict[str, Optional[int]]) -> Any:
+    """
+    Like _get_com_property, but resolves DISPIDs with GetIDsOfNames once per element type:
+    dispids is shared by all elements of one Type (same interface - same DISPIDs).
+    Raises AttributeError if the member does not exist.
+    """
+    if name in dispids:
+        dispid = dispids[name]
+    else:
+        oleobj = getattr(com_object, "_oleobj_", None)
+        if oleobj is None:
+            return getattr(com_object, name) # Не COM-объект
+        try:
+            dispid = oleobj.GetIDsOfNames(name)
+        except pythoncom.com_error as e:
+            if e.hresult != _DISP_E_UNKNOWNNAME:
+                raise
+            dispid = None
+        dispids[name] = dispid
+    if dispid is None:
+        raise AttributeError(name)
+    return _invoke_property_get(com_object, dispid)
+
+
+# Сколько элементов запрашивать за один IEnumVARIANT::Next
+_ENUM_BATCH_SIZE = 256
+
+
+def _enumerate_children(children_collection: Any, count_hint: int = 0) -> Optional[List[Any]]:
+    """
+    Materializes a GuiComponentCollection through its IEnumVARIANT, fetching the children
+    in batches (one Next(n) call per count_hint/_ENUM_BATCH_SIZE items) instead of one
+    round-trip per child. Returns None if the collection cannot be enumerated (callers then index it).
+    """
+    try:
+        enum = children_collection._oleobj_.InvokeTypes(
+            pythoncom.DISPID_NEWENUM, 0, pythoncom.DISPATCH_METHOD | pythoncom.DISPATCH_PROPERTYGET, (13, 10), ())
+        enum = enum.QueryInterface(pythoncom.IID_IEnumVARIANT)
+        batch_size = count_hint if count_hint > 0 else _ENUM_BATCH_SIZE
+        children: List[Any] = []
+        while True:
+            batch = enum.Next(batch_size)
+            if not batch:
+                break
+            children.extend(win32com.client.Dispatch(item) if isinstance(item, _PyIDispatchType) else item for item in batch)
+            if len(batch) < batch_size or len(children) == count_hint:
+                break # Перечисление закончилось (или получили все Count элементов)
+        return children
+    except Exception:
+        pass
+    try:
+        return list(children_collection._NewEnum()) # Обертка pywin32: по одному Next(1) на элемент
+    except Exception:
+        return None
+
+
+# HRESULT DISP_E_EXCEPTION: так SAP GUI сообщает об ошибках, в т.ч. "The control could not be found by id."
+_SAP_NOT_FOUND_HR = -2147352567
+# wCode в excepinfo для "The control could not be found by id." (источник 'SAP Frontend Server')
+_SAP_NOT_FOUND_WCODE = 619
+
+
+def _is_not_found_error(error: Exception) -> bool:
+    """ True if error is SAP GUI's 'control could not be found' COM error (or our own not-found error). """
+    if isinstance(error, exceptions.ElementNotFoundException):
+        return True
+    if isinstance(error, pywintypes.com_error):
+        # Сначала целочисленные коды из excepinfo, текст описания - только если код другой
+        excepinfo = error.excepinfo
+        return (error.hresult == _SAP_NOT_FOUND_HR and bool(excepinfo)
+                and (excepinfo[0] == _SAP_NOT_FOUND_WCODE or "could not be found" in (excepinfo[2] or "")))
+    message = str(error)
+    return "findById" in message or "control could not be found" in message.lower()
+
+
+# HRESULT устаревшей COM-ссылки: RPC_E_DISCONNECTED, CO_E_OBJNOTCONNECTED, RPC_E_SERVER_DIED_DNE
+_STALE_HANDLE_HRESULTS = frozenset({-2147417848, -2147220995, -2147418094})
+
+
+def _is_stale_handle_error(error: Exception) -> bool:
+    """
+    True if a COM call failed because the element handle is stale (the control is gone
+    from the current screen or the object was disconnected), i.e. a fresh findById may help.
+    Library exceptions and other COM errors are not retryable: the action may have run already.
+    """
+    if not isinstance(error, pywintypes.com_error):
+        return False
+    return error.hresult in _STALE_HANDLE_HRESULTS or _is_not_found_error(error)
+
+
+def _strip_mnemonic(text: str) -> str:
+    """ Removes '&' hotkey markers from a menu text; most texts have none, so skip translate then. """
+    return text.translate(_AMP_TABLE) if "&" in text else text
+
+
+# Класс + номер сообщения (тип E/A) после запуска транзакции -> фабрика исключения (транзакция, текст SAP).
+# Ключи без класса ("343") используются, только если SAP GUI не вернул MessageId.
+# Common error codes (may vary slightly by system version)
+_TXN_ERROR_MAP: Dict[str, Callable[[str, str], Exception]] = {
+    # Transaction & does not exist
+    "00343": lambda t, m: exceptions.TransactionNotFoundError(f"Transaction '{t}' not found. SAP: {m}"),
+    "343": lambda t, m: exceptions.TransactionNotFoundError(f"Transaction '{t}' not found. SAP: {m}"),
+    # User & is not authorized...
+    "00077": lambda t, m: exceptions.AuthorizationError(f"Not authorized for transaction '{t}'. SAP: {m}"),
+    "077": lambda t, m: exceptions.AuthorizationError(f"Not authorized for transaction '{t}'. SAP: {m}"),
+    # Action was blocked... (e.g., SM04 lock)
+    "00410": lambda t, m: exceptions.ActionBlockedError(f"Action blocked in transaction '{t}'. SAP: {m}"),
+    "410": lambda t, m: exceptions.ActionBlockedError(f"Action blocked in transaction '{t}'. SAP: {m}"),
+    # No authorization to start transaction &
+    "00057": lambda t, m: exceptions.AuthorizationError(f"Not authorized for transaction '{t}' (Msg 00057). SAP: {m}"),
+}
+
+
+class _LazyComType:
+    """ Formats as element.Type, read only when an exception message is actually shown. """
+    __slots__ = ("_element",)
+
+    def __init__(self, element: Any) -> None:
+        self._element = element
+
+    def __str__(self) -> str:
+        try:
+            return str(self._element.Type)
+        except Exception:
+            return "<unknown>"
+
+
+class BoundScreen:
+    """
+    Elements of one fixed SAP screen, resolved once by Window.bind_screen().
+    Actions go straight to the bound COM objects, without findById or cache lookups.
+    A handle that fails (e.g. after the screen was left and entered again) is
+    resolved again once before the error is reported.
+    """
+
+    def __init__(self, session_handle: win32com.client.CDispatch, template: Dict[str, str]) -> None:
+        self.session_handle = session_handle
+        self._ids = dict(template) # Логическое имя -> ID элемента SAP
+        self._elements: Dict[str, win32com.client.CDispatch] = {}
+        for name in self._ids:
+            self._resolve(name)
+
+    def __repr__(self) -> str:
+        return f"BoundScreen({list(self._ids)})"
+
+    def __getitem__(self, name: str) -> win32com.client.CDispatch:
+        """ Returns the bound COM object for a logical name. """
+        return self._elements[name]
+
+    def _resolve(self, name: str) -> win32com.client.CDispatch:
+        sap_id = self._ids[name]
+        try:
+            element = self.session_handle.findById(sap_id)
+        except Exception as e:
+            raise exceptions.ElementNotFoundException(f"Element '{name}' ({sap_id}) not found: {e}") from e
+        self._elements[name] = element
+        return element
+
+    def _call(self, name: str, action: Callable[[win32com.client.CDispatch], Any]) -> Any:
+        try:
+            return action(self._elements[name])
+        except pywintypes.com_error as e:
+            if not _is_stale_handle_error(e):
+                raise # Действие могло уже выполниться - не повторяем
+            # Ссылка устарела после смены экрана - привязываем заново и повторяем один раз
+            return action(self._resolve(name))
+
+    def refresh(self) -> None:
+        """ Resolves all elements again, e.g. after returning to the screen. """
+        for name in self._ids:
+            self._resolve(name)
+
+    def press(self, name: str) -> None:
+        """ Presses the bound element. """
+        try:
+            self._call(name, lambda el: el.press())
+        except exceptions.ElementNotFoundException:
+            raise
+        except Exception as ex:
+            raise exceptions.ActionException(f"Error pressing element '{name}': {ex}")
+
+    def write(self, name: str, text: str) -> None:
+        """ Sets text property of the bound element. """
+        def _write(el: win32com.client.CDispatch) -> None:
+            el.text = str(text)
+
+        try:
+            self._call(name, _write)
+        except exceptions.ElementNotFoundException:
+            raise
+        except Exception as ex:
+            raise exceptions.ActionException(f"Error writing to element '{name}': {ex}")
+
+    def read(self, name: str) -> str:
+        """ Reads text property of the bound element. """
+        try:
+            return self._call(name, lambda el: el.text)
+        except exceptions.ElementNotFoundException:
+            raise
+        except Exception as ex:
+            raise exceptions.ActionException(f"Error reading element '{name}': {ex}")
+
+    def send_v_key(self, name: str, value: int = 0) -> None:
+        """ Sends VKey to the bound element (usually a window). """
+        try:
+            self._call(name, lambda el: el.sendVKey(value))
+        except exceptions.ElementNotFoundException:
+            raise
+        except Exception as ex:
+            raise exceptions.ActionException(f"Error sending VKey {value} to element '{name}': {ex}")
+
+
 class Window:
+    # Кнопки панели инструментов для navigate(); словарь создается один раз, а не на каждый вызов
+    _NAV_MAP: ClassVar[Dict[NavigateAction, str]] = {
+        NavigateAction.enter: "wnd[0]/tbar[0]/btn[0]",
+        NavigateAction.back: "wnd[0]/tbar[0]/btn[3]",
+        NavigateAction.end: "wnd[0]/tbar[0]/btn[15]",
+        NavigateAction.cancel: "wnd[0]/tbar[0]/btn[12]",
+        NavigateAction.save: "wnd[0]/tbar[0]/btn[11]", # Corrected VKey for Save
+    }
+    # Запрошенное имя свойства -> вариант написания, который сработал в get_element_property
+    _PROP_NAME_CACHE: ClassVar[Dict[str, str]] = {}
+    # Basic properties that are usually safe to read (dump_element_state); read in one attrgetter call
+    _SAFE_PROPS: ClassVar[Tuple[str, ...]] = ('Id', 'Type', 'Name', 'Text', 'Changeable', 'ContainerType', 'ScreenLeft', 'ScreenTop', 'Width', 'Height', 'Tooltip', 'DefaultTooltip', 'IconName')
+    _SAFE_GETTER: ClassVar[Callable[[Any], Tuple[Any, ...]]] = operator.attrgetter(*_SAFE_PROPS)
+    # Attempt to read other properties (use with caution) - limited list for safety
+    _OTHER_PROPS: ClassVar[Tuple[str, ...]] = ('selected', 'Left', 'Top') # Add more cautiously if needed
+
     # --- ИЗМЕНЕНИЕ: Добавлен application в __init__ ---
     def __init__(
         self,
@@ -41,6 +521,15 @@ class Window:
         self.session = session
         self.session_handle = session_handle
         self._finder = SapElementFinder(self.session_handle)
+        # Те же поля, что сравнивает __eq__; вычисляем один раз, без str() COM-объектов
+        self._hash = hash((self.connection, self.session))
+        # LRU-кэш findById: id элемента -> CDispatch. Сбрасывается при смене экрана
+        self._id_cache: "OrderedDict[str, win32com.client.CDispatch]" = OrderedDict()
+        # LRU-кэш локаторов: (локатор, типы) -> id элемента. Сбрасывается вместе с _id_cache
+        self._locator_cache: "OrderedDict[Tuple[str, Optional[Tuple[str, ...]]], str]" = OrderedDict()
+        self._sbar_dispids: Optional[Tuple[int, ...]] = None # DISPID свойств из _SBAR_PROPERTIES
+        # (Id родительского меню, имя пункта) -> Id найденного пункта меню
+        self._menu_cache: Dict[Tuple[str, str], str] = {}
 
     def __repr__(self) -> str:
         return f"Window(connection={self.connection}, session={self.session})"
@@ -54,8 +543,55 @@ class Window:
 
         return False
 
-    def __hash__(self) -> hash:
-        return hash(f"{self.connection_handle}{self.session_handle}")
+    def __hash__(self) -> int:
+        return self._hash
+
+    def _find(self, element_id: str) -> win32com.client.CDispatch:
+        """ Returns the element by id, from the cache if it was looked up before. """
+        cache = self._id_cache
+        element = cache.get(element_id)
+        if element is not None:
+            cache.move_to_end(element_id)
+            return element
+        # FindById(id, False) возвращает None вместо COM-исключения, если элемента нет
+        element = self.session_handle.FindById(element_id, False)
+        if element is None:
+            raise exceptions.ElementNotFoundException(f"Element '{element_id}' not found.")
+        cache[element_id] = element
+        if len(cache) > _ID_CACHE_SIZE:
+            cache.popitem(last=False) # Вытесняем самый старый
+        return element
+
+    def _on_element(self, element_id: str, action: Callable[[win32com.client.CDispatch], Any]) -> Any:
+        """
+        Runs action on the (cached) element. A cached handle may be stale after a screen change;
+        only then (see _is_stale_handle_error) it is dropped and the action is retried once with
+        a fresh findById. Other errors propagate unchanged, so non-idempotent actions never run twice.
+        """
+        if element_id in self._id_cache:
+            try:
+                return action(self._find(element_id))
+            except pywintypes.com_error as e:
+                if not _is_stale_handle_error(e):
+                    raise
+                self._id_cache.pop(element_id, None)
+        return action(self._find(element_id))
+
+    def invalidate_cache(self) -> None:
+        """
+        Drops all cached element handles. Call it after changing the screen outside of this
+        Window (e.g. via session_handle directly), so the next lookup goes through findById again.
+        Also forgets resolved *_by_locator locators.
+        """
+        self._id_cache.clear()
+        self._locator_cache.clear()
+
+    def _find_live(self, element_id: str) -> win32com.client.CDispatch:
+        """ Like _find, but checks that a cached handle is still alive (reads its Id) before returning it. """
+        def touch(element: win32com.client.CDispatch) -> win32com.client.CDispatch:
+            element.Id # Устаревшая ссылка бросает COM-исключение -> _on_element повторит через findById
+            return element
+        return self._on_element(element_id, touch)
 
     # ... (существующие методы maximize, restore, close_window, navigate, etc.) ...
     # Копируем существующие методы для контекста
@@ -69,84 +605,91 @@ class Window:
 
     def close_window(self) -> None:
         """ Closes this sap window """
+        self.invalidate_cache()
         self.session_handle.findById("wnd[0]").close()
 
     def navigate(self, action: NavigateAction) -> None:
         """ Navigates SAP: enter, back, end, cancel, save """
-        el_map = {
-            NavigateAction.enter: "wnd[0]/tbar[0]/btn[0]",
-            NavigateAction.back: "wnd[0]/tbar[0]/btn[3]",
-            NavigateAction.end: "wnd[0]/tbar[0]/btn[15]",
-            NavigateAction.cancel: "wnd[0]/tbar[0]/btn[12]",
-            NavigateAction.save: "wnd[0]/tbar[0]/btn[11]", # Corrected VKey for Save
-        }
-        el = el_map.get(action)
+        el = self._NAV_MAP.get(action)
         if not el:
             raise exceptions.ActionException("Wrong navigation action!")
         self.press(el) # Use self.press for consistency and error handling
+        self.invalidate_cache() # Экран сменился, старые ссылки на элементы недействительны
 
     def start_transaction(self, transaction: str) -> None:
         """ Starts transaction """
         self.write("wnd[0]/tbar[0]/okcd", transaction)
         self.press("wnd[0]/tbar[0]/btn[0]") # Send Enter
+        self.invalidate_cache()
 
     def press(self, element: str) -> None:
         """ Presses element """
+        # Нажатие может сменить экран: позиционный ID из локатора (usr/lbl[10,3]) там - другой элемент
+        self._locator_cache.clear()
         try:
-            self.session_handle.findById(element).press()
+            self._on_element(element, lambda el: el.press())
         except Exception as ex:
             raise exceptions.ActionException(f"Error pressing element {element}: {ex}")
 
     def select(self, element: str) -> None:
         """ Selects element or menu item """
+        self._locator_cache.clear() # Вкладка/пункт меню меняют экран (см. press)
         try:
-            self.session_handle.findById(element).select()
+            self._on_element(element, lambda el: el.select())
         except Exception as ex:
             raise exceptions.ActionException(f"Error selecting element {element}: {ex}")
 
     def is_selected(self, element: str) -> bool:
         """ Gets status of select element """
         try:
-            return self.session_handle.findById(element).selected
+            return self._on_element(element, lambda el: el.selected)
         except Exception as ex:
             raise exceptions.ActionException(f"Error getting status of element {element}: {ex}")
 
     def set_checkbox(self, element: str, selected: bool) -> None:
         """ Selects checkbox element """
-        try:
-            # Ensure the value passed is boolean
-            checkbox = self.session_handle.findById(element)
+        def _set(checkbox: win32com.client.CDispatch) -> None:
             if checkbox.Type != "GuiCheckBox":
                  raise exceptions.ActionException(f"Element {element} is not a GuiCheckBox (Type: {checkbox.Type}).")
+            # Ensure the value passed is boolean
             checkbox.selected = bool(selected)
+
+        try:
+            self._on_element(element, _set)
         except Exception as ex:
             raise exceptions.ActionException(f"Error setting checkbox {element}: {ex}")
 
     def write(self, element: str, text: str) -> None:
         """ Sets text property of an element """
-        try:
-            target_element = self.session_handle.findById(element)
-            # Basic check if element likely accepts text
-            if not hasattr(target_element, "text"):
+        def _write(target_element: win32com.client.CDispatch) -> None:
+            # Без предварительного hasattr (лишний COM-вызов): pywin32 сам дает AttributeError
+            try:
+                target_element.text = str(text) # Ensure text is string
+            except AttributeError:
                  raise exceptions.ActionException(f"Element {element} (Type: {target_element.Type}) does not seem to have a 'text' property.")
-            target_element.text = str(text) # Ensure text is string
+
+        try:
+            self._on_element(element, _write)
         except Exception as ex:
             raise exceptions.ActionException(f"Error writing to element {element}: {ex}")
 
     def read(self, element: str) -> str:
         """ Reads text property """
-        try:
-            target_element = self.session_handle.findById(element)
-            if not hasattr(target_element, "text"):
+        def _read(target_element: win32com.client.CDispatch) -> str:
+            try:
+                return target_element.text
+            except AttributeError:
                  raise exceptions.ActionException(f"Element {element} (Type: {target_element.Type}) does not seem to have a 'text' property.")
-            return target_element.text
+
+        try:
+            return self._on_element(element, _read)
         except Exception as e:
             raise exceptions.ActionException(f"Error reading element {element}: {e}")
 
     def visualize(self, element: str, seconds: int = 1) -> None:
         """ draws red frame around the element """
         try:
-            self.session_handle.findById(element).Visualize(True) # Use True instead of 1
+            self._on_element(element, lambda el: el.Visualize(True)) # Use True instead of 1
             sleep(seconds)
             # Optional: Turn off visualization afterwards? SAP GUI might do this automatically.
             # self.session_handle.findById(element).Visualize(False)
@@ -156,35 +699,56 @@ class Window:
     def exists(self, element: str) -> bool:
         """ checks if element exists by trying to access it """
         try:
-            self.session_handle.findById(element)
+            # Всегда свежий findById: ссылка из кэша не доказывает, что элемент еще на экране
+            self._id_cache.pop(element, None)
+            self._find(element)
             return True
         except Exception:
             return False
 
     def send_v_key(
         self,
-        element: str = "wnd[0]",
+        element: Union[str, win32com.client.CDispatch] = "wnd[0]",
         *,
-        focus_element: Optional[str] = None, # Use Optional
+        focus_element: Optional[Union[str, win32com.client.CDispatch]] = None, # Use Optional
         value: int = 0,
     ) -> None:
-        """ Sends VKey to the window or element """
+        """
+        Sends VKey to the window or element.
+        element and focus_element may be ids or already resolved elements (skips the lookup in tight loops).
+        """
+        self._locator_cache.clear() # VKey обычно меняет экран (см. press)
         try:
-            target_element = self.session_handle.findById(element)
             if focus_element is not None:
-                self.session_handle.findById(focus_element).SetFocus()
-                sleep(0.1) # Small delay after setting focus might help
-            target_element.sendVKey(value)
+                if isinstance(focus_element, str):
+                    self._on_element(focus_element, lambda el: el.SetFocus())
+                else:
+                    focus_element.SetFocus()
+                self._wait_while_busy() # Вместо фиксированной паузы 0.1 сек
+            if isinstance(element, str):
+                self._on_element(element, lambda el: el.sendVKey(value))
+            else:
+                element.sendVKey(value)
         except Exception as e:
+            element_desc = element if isinstance(element, str) else getattr(element, "Id", "<element>")
+            focus_desc = focus_element if isinstance(focus_element, str) else getattr(focus_element, "Id", "<element>")
             raise exceptions.ActionException(
-                f"Error sending VKey {value} to element {element}"
-                f"{' after focusing ' + focus_element if focus_element else ''}: {e}"
+                f"Error sending VKey {value} to element {element_desc}"
+                f"{' after focusing ' + focus_desc if focus_element is not None else ''}: {e}"
             )
 
+    def _wait_while_busy(self, timeout: float = 0.1, poll_interval: float = 0.01) -> None:
+        """ Waits (at most timeout seconds) while the session reports Busy. Usually returns after one check. """
+        deadline = time.monotonic() + timeout
+        try:
+            while self.session_handle.Busy and time.monotonic() < deadline:
+                sleep(poll_interval)
+        except Exception:
+            sleep(timeout) # Busy недоступен - ведем себя как раньше
+
     def read_html_viewer(self, element: str) -> str:
         """ Read the HTML content of the specified HTMLViewer element. """
-        try:
-            html_viewer = self.session_handle.findById(element)
+        def _read_html(html_viewer: win32com.client.CDispatch) -> str:
             if html_viewer.Type != "GuiHTMLViewer":
                  raise exceptions.ActionException(f"Element {element} is not a GuiHTMLViewer.")
             # Accessing BrowserHandle might fail if content isn't fully loaded or control is different
@@ -196,32 +760,67 @@ class Window:
             if not browser_handle or not browser_handle.Document:
                  raise exceptions.ActionException(f"Could not access BrowserHandle or Document for {element}.")
             return browser_handle.Document.documentElement.innerHTML
+
+        try:
+            return self._on_element(element, _read_html)
         except Exception as e:
             raise exceptions.ActionException(f"Error reading HTMLViewer element {element}: {e}")
 
-    def read_shell_table(self, element: str, load_table: bool = True) -> ShellTable:
+    def bind_screen(self, template: Dict[str, str]) -> BoundScreen:
+        """
+        Resolves the elements of a fixed screen once for fast repeated actions.
+
+        Args:
+            template (Dict[str, str]): Logical name -> SAP element ID,
+                                       e.g. {"okcode": "wnd[0]/tbar[0]/okcd", "enter": "wnd[0]/tbar[0]/btn[0]"}.
+
+        Returns:
+            BoundScreen: Object with press/write/read/send_v_key by logical name.
+
+        Raises:
+            exceptions.ElementNotFoundException: If an element of the template is not on the screen.
+
+        Example:
+            ```python
+            screen = main_window.bind_screen({"okcode": "wnd[0]/tbar[0]/okcd", "enter": "wnd[0]/tbar[0]/btn[0]"})
+            screen.write("okcode", "/nVA03")
+            screen.press("enter")
+            ```
+        """
+        return BoundScreen(self.session_handle, template)
+
+    def read_shell_table(self, element: str, load_table: bool = True,
+                         clipboard_function_code: Optional[str] = None) -> ShellTable:
         """ Read the table of the specified ShellTable/GuiGridView element. """
-        return ShellTable(self.session_handle, element, load_table)
+        return ShellTable(self.session_handle, element, load_table, clipboard_function_code)
 
     # --- Существующие методы из Ver2 ---
     def get_status_message(self, window_id: str = "wnd[0]") -> Optional[Tuple[str, str, str, str]]:
         """ Reads the message from the status bar of the specified window. """
-        statusbar_id = f"{window_id}/sbar"
+        statusbar_id = _WND0_SBAR if window_id == "wnd[0]" else f"{window_id}/sbar"
         try:
-            statusbar = self.session_handle.findById(statusbar_id)
-            msg_text = getattr(statusbar, "Text", "")
-            if msg_text:
-                msg_type = getattr(statusbar, "MessageType", "")
-                msg_id = getattr(statusbar, "MessageId", "").strip()
-                msg_number = getattr(statusbar, "MessageNumber", "") # Often not set, but good to have
-                return msg_type, msg_id, msg_number, msg_text
-            return None
+            return self._on_element(statusbar_id, self._read_statusbar)
         except Exception as e:
-            if "findById" in str(e):
+            if _is_not_found_error(e):
                  return None
             else:
                  raise exceptions.StatusBarException(f"Error reading status bar '{statusbar_id}': {e}")
                 
+    def _read_statusbar(self, statusbar: win32com.client.CDispatch) -> Optional[Tuple[str, str, str, str]]:
+        """ Reads the status bar properties by cached DISPIDs, skipping pywin32's getattr dispatch. """
+        oleobj = statusbar._oleobj_
+        if self._sbar_dispids is None:
+            self._sbar_dispids = tuple(oleobj.GetIDsOfNames(name) for name in _SBAR_PROPERTIES)
+        invoke = oleobj.Invoke
+        text_id, type_id, msg_id_id, number_id = self._sbar_dispids
+        msg_text = invoke(text_id, 0, pythoncom.DISPATCH_PROPERTYGET, True) or ""
+        if not msg_text:
+            return None # Пустая строка статуса - остальные свойства не читаем
+        msg_type = invoke(type_id, 0, pythoncom.DISPATCH_PROPERTYGET, True) or ""
+        msg_id = (invoke(msg_id_id, 0, pythoncom.DISPATCH_PROPERTYGET, True) or "").strip()
+        msg_number = invoke(number_id, 0, pythoncom.DISPATCH_PROPERTYGET, True) or "" # Often not set, but good to have
+        return msg_type, msg_id, msg_number, msg_text
+
     def assert_status_bar(self,
                           window_id: str = "wnd[0]",
                           # --- Ожидаемые значения (любое или комбинация) ---
@@ -250,9 +849,12 @@ class Window:
                                                                                Преобразуется в строку для сравнения.
             expected_text (Optional[Union[str, Pattern]]): Ожидаемый текст сообщения. Может быть строкой для точного
                                                           совпадения (после strip) или скомпилированным
-                                                          регулярным выражением (re.Pattern).
+                                                          регулярным выражением (re.Pattern или любой объект
+                                                          с методом search(), например re2.compile(...) для
+                                                          линейного времени сопоставления в частых проверках).
             timeout (float): Максимальное время ожидания появления сообщения (в секундах).
-            poll_interval (float): Интервал между попытками чтения статус-бара (в секундах).
+            poll_interval (float): Максимальный интервал между попытками чтения статус-бара (в секундах).
+                                   Пауза начинается с 10 мс и удваивается до этого значения.
             raise_exception (bool): Выбрасывать ли StatusBarAssertionError, если проверка не пройдена.
                                     Если False, возвращает True/False.
             fail_on_timeout (bool): Считать ли ошибкой, если за время timeout сообщение так и не появилось
@@ -270,8 +872,32 @@ class Window:
         if expected_type is None and expected_id is None and expected_number is None and expected_text is None:
             raise ValueError("Необходимо задать хотя бы один критерий для проверки статус-бара.")
 
+        # --- Допустимые значения не меняются между опросами, готовим их один раз ---
+        allowed_types = None
+        if expected_type is not None:
+            allowed_types = frozenset([expected_type] if isinstance(expected_type, str) else expected_type)
+        allowed_ids = None
+        if expected_id is not None:
+            # Сравнение регистрозависимо, как и в SAP
+            allowed_ids = frozenset([expected_id] if isinstance(expected_id, str) else expected_id)
+        allowed_numbers_str = None
+        if expected_number is not None:
+            # Сравниваем как строки, т.к. msg_number тоже строка
+            if isinstance(expected_number, (str, int)):
+                allowed_numbers_str = frozenset([str(expected_number)])
+            else: # Список
+                allowed_numbers_str = frozenset(str(n) for n in expected_number)
+        expected_text_str: Optional[str] = None
+        expected_text_pat: Optional[Pattern] = None
+        if isinstance(expected_text, re.Pattern) or (expected_text is not None and hasattr(expected_text, "search")):
+            # Любой скомпилированный шаблон с .search(): re или, например, re2.compile(...)
+            expected_text_pat = expected_text
+        elif expected_text is not None:
+            expected_text_str = str(expected_text).strip()
+
         start_time = time.monotonic()
-        last_status_data: Optional[Tuple[str, str, str]] = None
+        last_status_data: Optional[Tuple[str, str, str, str]] = None
+        delay = min(0.01, poll_interval) # Экспоненциальная пауза: 10 мс -> 20 мс -> ... -> poll_interval
 
         while time.monotonic() - start_time < timeout:
             try:
@@ -280,43 +906,25 @@ class Window:
                     last_status_data = current_status_data # Запоминаем последнее непустое сообщение
                     msg_type, msg_id, msg_number, msg_text = current_status_data
 
-                    # --- Выполняем проверки ---
-                    type_match = True
-                    if expected_type is not None:
-                        allowed_types = [expected_type] if isinstance(expected_type, str) else expected_type
-                        type_match = msg_type in allowed_types
-                    # --- НОВОЕ: Добавляем проверку ID ---
-                    id_match = True
-                    if expected_id is not None:
-                        allowed_ids = [expected_id] if isinstance(expected_id, str) else expected_id
-                        # Сравнение регистрозависимо, как и в SAP
-                        id_match = msg_id in allowed_ids
-                    # --- КОНЕЦ НОВОГО ---
-                    number_match = True
-                    if expected_number is not None:
-                        allowed_numbers_str = []
-                        if isinstance(expected_number, (str, int)):
-                             allowed_numbers_str.append(str(expected_number))
-                        else: # Список
-                             allowed_numbers_str = [str(n) for n in expected_number]
-                        # Сравниваем как строки, т.к. msg_number тоже строка
-                        number_match = msg_number in allowed_numbers_str
-
-                    text_match = True
-                    if expected_text is not None:
-                        cleaned_msg_text = msg_text.strip()
-                        if isinstance(expected_text, re.Pattern):
-                            text_match = expected_text.search(cleaned_msg_text) is not None
-                        else: # Точное совпадение строки
-                            text_match = cleaned_msg_text == str(expected_text).strip()
+                    # --- Выполняем проверки (сначала дешевые, текст/регулярка последними) ---
+                    matched = (
+                        (allowed_types is None or msg_type in allowed_types)
+                        and (allowed_ids is None or msg_id in allowed_ids)
+                        and (allowed_numbers_str is None or msg_number in allowed_numbers_str)
+                    )
+                    if matched and expected_text_str is not None: # Точное совпадение строки
+                        matched = msg_text.strip() == expected_text_str
+                    elif matched and expected_text_pat is not None:
+                        matched = expected_text_pat.search(msg_text.strip()) is not None
 
                     # --- Финальное решение ---
-                    if type_match and id_match and number_match and text_match:
+                    if matched:
                         log.info(f"Проверка статус-бара пройдена. Сообщение: (T='{msg_type}', ID='{msg_id}', N='{msg_number}', Text='{msg_text}')")
                         return True # Все указанные критерии совпали
 
                 # Если сообщение есть, но не совпало, или сообщения пока нет, ждем дальше
-                time.sleep(poll_interval)
+                time.sleep(delay)
+                delay = min(delay * 2, poll_interval)
 
             except exceptions.StatusBarException as e:
                 # Перебрасываем серьезные ошибки чтения
@@ -350,39 +958,60 @@ class Window:
                  log.info(f"Сообщение в статус-баре не появилось за {timeout} сек (fail_on_timeout=False). Проверка пропущена.")
                  return True # Считаем успехом, т.к. нет сообщения для проверки            
 
-    def _find_menu_item_recursive(self, menu_element: win32com.client.CDispatch, target_names: List[str]) -> Optional[win32com.client.CDispatch]:
-        """Recursive helper to find a menu item by name."""
+    def _find_menu_item_recursive(self, menu_element: win32com.client.CDispatch, target_names: Set[str]) -> Optional[win32com.client.CDispatch]:
+        """Helper to find a menu item by name (iterative breadth-first walk, nearest match wins)."""
+        queue = deque([menu_element])
+        while queue:
+            element = queue.popleft()
+            try:
+                cleaned_text = _strip_mnemonic(getattr(element, "Text", ""))
+                if cleaned_text in target_names:
+                    return element
+                children = getattr(element, "Children", None) # Одно обращение к Children вместо hasattr + чтения
+                if children is not None:
+                     count = getattr(children, "Count", 0)
+                     items = _enumerate_children(children, count) if count else []
+                     queue.extend(items if items is not None else (children(i) for i in range(count)))
+            except Exception:
+                 pass
+        return None
+
+    def _get_cached_menu_item(self, cache_key: Tuple[str, str]) -> Optional[win32com.client.CDispatch]:
+        """Resolves a menu item remembered in _menu_cache, if it is still there under the same name."""
+        item_id = self._menu_cache.get(cache_key)
+        if item_id is None:
+            return None
         try:
-            element_text = getattr(menu_element, "Text", "")
-            cleaned_text = element_text.replace("&", "")
-            if cleaned_text in target_names:
-                return menu_element
-            if hasattr(menu_element, "Children"):
-                 children_count = getattr(menu_element.Children, "Count", 0)
-                 for i in range(children_count):
-                    child = menu_element.Children(i)
-                    found = self._find_menu_item_recursive(child, target_names)
-                    if found:
-                        return found
+            element = self.session_handle.findById(item_id)
+            # Меню зависит от экрана: по тому же Id может оказаться другой пункт
+            if _strip_mnemonic(getattr(element, "Text", "")) == cache_key[1]:
+                return element
         except Exception:
-             pass
+            pass
+        del self._menu_cache[cache_key]
         return None
 
     def select_menu_item_by_name(self, menu_path: List[str], window_id: str = "wnd[0]") -> None:
         """ Selects a menu item by navigating through menu names. """
         if not menu_path:
             raise ValueError("Menu path cannot be empty.")
-        menu_bar_id = f"{window_id}/mbar"
+        menu_bar_id = _WND0_MBAR if window_id == "wnd[0]" else f"{window_id}/mbar"
         try:
-            current_element = self.session_handle.findById(menu_bar_id)
+            current_id = menu_bar_id
+            current_element = None # Ищем через findById только если пункта нет в _menu_cache
             element_to_select = None
             for i, name in enumerate(menu_path):
-                target_names = [name]
-                found_element = self._find_menu_item_recursive(current_element, target_names)
-                if not found_element:
-                    raise exceptions.MenuNotFoundException(
-                        f"Menu item '{name}' not found in path: {' -> '.join(menu_path[:i+1])}"
-                    )
+                cache_key = (current_id, name)
+                found_element = self._get_cached_menu_item(cache_key)
+                if found_element is None:
+                    if current_element is None:
+                        current_element = self.session_handle.findById(current_id)
+                    found_element = self._find_menu_item_recursive(current_element, {name})
+                    if not found_element:
+                        raise exceptions.MenuNotFoundException(
+                            f"Menu item '{name}' not found in path: {' -> '.join(menu_path[:i+1])}"
+                        )
+                    self._menu_cache[cache_key] = found_element.Id
                 if i == len(menu_path) - 1:
                     element_to_select = found_element
                 else:
@@ -390,6 +1019,7 @@ class Window:
                      # Selecting intermediate menus might be one way, but risky.
                      # Let's assume the recursive search handles expanded/unexpanded state.
                      current_element = found_element
+                     current_id = self._menu_cache[cache_key]
 
             if element_to_select:
                  if hasattr(element_to_select, "Select"):
@@ -415,28 +1045,23 @@ class Window:
         try:
             self.write(okcode_field, tcode_command)
             self.press("wnd[0]/tbar[0]/btn[0]") # Use Enter button press
+            self.invalidate_cache()
             if check_errors:
                 sleep(0.5) # Wait for status bar update
                 status = self.get_status_message()
                 if status:
-                    msg_type, msg_number, msg_text = status
+                    msg_type, msg_id, msg_number, msg_text = status # (type, id, number, text)
+                    # "00" + "343" -> "00343": номер 343 из другого класса (напр. V1) не должен совпасть
+                    full_number = f"{msg_id}{msg_number}" if msg_id else msg_number
                     if msg_type == 'E' or msg_type == 'A': # Error or Abort
-                        # Common error codes (may vary slightly by system version)
-                        if msg_number in ["00343", "343"]: # Transaction & does not exist
-                            raise exceptions.TransactionNotFoundError(f"Transaction '{transaction}' not found. SAP: {msg_text}")
-                        elif msg_number in ["00077", "077"]: # User & is not authorized...
-                             raise exceptions.AuthorizationError(f"Not authorized for transaction '{transaction}'. SAP: {msg_text}")
-                        elif msg_number in ["00410", "410"]: # Action was blocked... (e.g., SM04 lock)
-                             raise exceptions.ActionBlockedError(f"Action blocked in transaction '{transaction}'. SAP: {msg_text}")
-                        # --- ДОБАВЛЕНО: Еще одна проверка авторизации ---
-                        elif msg_number == "00057": # No authorization to start transaction &
-                              raise exceptions.AuthorizationError(f"Not authorized for transaction '{transaction}' (Msg 00057). SAP: {msg_text}")
-                        # --- КОНЕЦ ДОБАВЛЕНИЯ ---
+                        factory = _TXN_ERROR_MAP.get(full_number)
+                        if factory is not None:
+                            raise factory(transaction, msg_text)
                         else: # General Error/Abort not specifically identified
-                            print(f"Warning/Error in status bar after starting '{transaction}': Type={msg_type}, Num={msg_number}, Text={msg_text}")
+                            print(f"Warning/Error in status bar after starting '{transaction}': Type={msg_type}, Num={full_number}, Text={msg_text}")
                             # Optionally raise a generic error
                             # raise exceptions.TransactionException(f"Error after starting '{transaction}'. SAP: {msg_text}")
-                    elif msg_type == 'S' and msg_number == "00344": # Transaction & is locked (SM01)
+                    elif msg_type == 'S' and full_number == "00344": # Transaction & is locked (SM01)
                          raise exceptions.ActionBlockedError(f"Transaction '{transaction}' is locked (SM01). SAP: {msg_text}")
 
         except (exceptions.TransactionNotFoundError, exceptions.AuthorizationError, exceptions.ActionBlockedError):
@@ -456,6 +1081,16 @@ class Window:
         # except Exception as e:
         #      raise exceptions.ElementNotFoundException(f"Root element '{root_element_id}' not found: {e}")
 
+        # Быстрый путь: один обход Children родителя вместо findById (и COM-исключения в конце) на каждый индекс
+        matched = self._match_template_children(id_template, start_index, max_index)
+        if matched:
+            for index in range(start_index, max_index + 1):
+                element = matched.get(index)
+                if element is None:
+                    break # Как и раньше, перечисление заканчивается на первом пропуске
+                yield index, element
+            return
+
         for index in range(start_index, max_index + 1):
             try:
                 element_id = id_template.format(index=index)
@@ -463,45 +1098,73 @@ class Window:
                 yield index, element
             except Exception as e:
                 # Check if it's likely an 'element not found' error
-                if "findById" in str(e) or "control could not be found" in str(e).lower():
+                if _is_not_found_error(e):
                     break # End of list/grid for this template
                 else:
                     # Re-raise unexpected errors
                     raise exceptions.SapGuiComException(f"Error finding element with template '{id_template}' at index {index}: {e}")
 
+    def _match_template_children(self, id_template: str, start_index: int,
+                                 max_index: int) -> Dict[int, win32com.client.CDispatch]:
+        """
+        Collects {index: element} for id_template from the Children of its parent element.
+        Works only when '{index}' appears once, in the last segment of the template;
+        returns an empty dict when the template does not fit or nothing matched.
+        """
+        parent_id, sep, last_segment = id_template.rpartition("/")
+        if not sep or id_template.count("{") != 1 or "{index}" not in last_segment:
+            return {}
+        prefix, _, suffix = last_segment.partition("{index}")
+        pattern = re.compile("/" + re.escape(prefix) + r"(\d+)" + re.escape(suffix) + "$")
+        matched: Dict[int, win32com.client.CDispatch] = {}
+        try:
+            children = self.session_handle.findById(parent_id).Children
+            count = children.Count
+            items = _enumerate_children(children, count)
+            for child in (items if items is not None else (children(i) for i in range(count))):
+                m = pattern.search(child.Id)
+                if m:
+                    index = int(m.group(1))
+                    if start_index <= index <= max_index:
+                        matched[index] = child
+        except Exception:
+            return {} # Родитель без Children и т.п. - пусть работает поиск по findById
+        return matched
+
     def print_all_elements(self, root_element_id: str = "wnd[0]") -> None:
         """ Prints the IDs and types of all direct child elements of a specified root element. """
-        print(f"--- Elements inside '{root_element_id}' ---")
+        lines = [f"--- Elements inside '{root_element_id}' ---"] # Печатаем одним print в конце
         try:
             root_element = self.session_handle.findById(root_element_id)
-            if not hasattr(root_element, "Children"):
-                print(f"Element '{root_element_id}' (Type: {getattr(root_element, 'Type', 'N/A')}) has no Children attribute.")
+            children = getattr(root_element, "Children", None) # Одно обращение к Children вместо hasattr + чтения
+            if children is None:
+                lines.append(f"Element '{root_element_id}' (Type: {getattr(root_element, 'Type', 'N/A')}) has no Children attribute.")
                 return
-            children_count = getattr(root_element.Children, "Count", 0)
+            children_count = getattr(children, "Count", 0)
             if children_count == 0:
-                print("(No children found)")
+                lines.append("(No children found)")
                 return
             for i in range(children_count):
                 try:
-                    child = root_element.Children(i)
+                    child = children(i)
                     child_id = getattr(child, "Id", f"<Error getting ID for index {i}>")
                     child_type = getattr(child, "Type", "N/A")
                     child_name = getattr(child, "Name", "") # Name (not ID) sometimes useful
-                    print(f"  Index: {i}, ID: {child_id} (Type: {child_type}, Name: '{child_name}')")
+                    lines.append(f"  Index: {i}, ID: {child_id} (Type: {child_type}, Name: '{child_name}')")
                 except Exception as e_child:
-                    print(f"  Index: {i}, Error accessing child element: {e_child}")
+                    lines.append(f"  Index: {i}, Error accessing child element: {e_child}")
         except Exception as e_root:
-            if "findById" in str(e_root) or "control could not be found" in str(e_root).lower():
+            if _is_not_found_error(e_root):
                  raise exceptions.ElementNotFoundException(f"Root element '{root_element_id}' not found: {e_root}")
             else:
                  raise exceptions.SapGuiComException(f"Error getting children for '{root_element_id}': {e_root}")
         finally:
-                 print(f"--- End of elements for '{root_element_id}' ---")
+                 lines.append(f"--- End of elements for '{root_element_id}' ---")
+                 print("\n".join(lines))
 
     def scroll_element(self, element_id: str, position: int) -> None:
         """ Scrolls the vertical scrollbar of a given element to a specific position. """
-        try:
-            element = self.session_handle.findById(element_id)
+        def _scroll(element: win32com.client.CDispatch) -> None:
             if hasattr(element, "verticalScrollbar"):
                 scrollbar = element.verticalScrollbar
                 if hasattr(scrollbar, "position"):
@@ -515,6 +1178,9 @@ class Window:
                      print(f"Used firstVisibleRow for GuiTableControl {element_id}")
                  else:
                      raise exceptions.ActionException(f"Element '{element_id}' (Type: {getattr(element, 'Type', 'N/A')}) has no controllable 'verticalScrollbar' or applicable fallback.")
+
+        try:
+            self._on_element(element_id, _scroll)
         except AttributeError as ae:
              raise exceptions.ActionException(f"Attribute error while scrolling element '{element_id}': {ae}. Check element type and properties.")
         except Exception as e:
@@ -538,26 +1204,34 @@ class Window:
             exceptions.PropertyNotFoundException: If the element does not have the specified property.
             exceptions.SapGuiComException: For other COM errors.
         """
+        def _get(element: win32com.client.CDispatch) -> Any:
+            # Сначала вариант имени, найденный в прошлый раз: обычно это один COM-вызов вместо hasattr + getattr
+            canonical = self._PROP_NAME_CACHE.get(property_name)
+            if canonical is not None:
+                try:
+                    return getattr(element, canonical)
+                except AttributeError:
+                    pass
+            # Check common case variations if initial getattr fails (experimental)
+            for candidate in (property_name, property_name.lower(), property_name.capitalize()):
+                try:
+                    value = getattr(element, candidate)
+                except AttributeError:
+                    continue
+                self._PROP_NAME_CACHE[property_name] = candidate
+                return value
+            raise exceptions.PropertyNotFoundException(
+                "Property '%s' not found for element '%s' (Type: %s).", property_name, element_id, _LazyComType(element))
+
         try:
-            element = self.session_handle.findById(element_id)
-            if hasattr(element, property_name):
-                return getattr(element, property_name)
-            else:
-                # Check common case variations if initial getattr fails (experimental)
-                if hasattr(element, property_name.lower()):
-                    return getattr(element, property_name.lower())
-                elif hasattr(element, property_name.capitalize()):
-                     return getattr(element, property_name.capitalize())
-                else:
-                     raise exceptions.PropertyNotFoundException(
-                         f"Property '{property_name}' not found for element '{element_id}' (Type: {element.Type}).")
+            return self._on_element(element_id, _get)
         except exceptions.PropertyNotFoundException:
              raise
         except Exception as e:
-            if "findById" in str(e) or "control could not be found" in str(e).lower():
+            if _is_not_found_error(e):
                 raise exceptions.ElementNotFoundException(f"Element '{element_id}' not found: {e}")
             else:
-                raise exceptions.SapGuiComException(f"Error getting property '{property_name}' for element '{element_id}': {e}")
+                raise exceptions.SapGuiComException("Error getting property '%s' for element '%s': %s", property_name, element_id, e)
 
     def set_element_property(self, element_id: str, property_name: str, value: Any) -> None:
         """
@@ -574,72 +1248,97 @@ class Window:
             exceptions.PropertyNotFoundException: If the element does not have the specified property.
             exceptions.SapGuiComException: If setting the property fails (e.g., read-only) or other COM errors.
         """
-        try:
-            element = self.session_handle.findById(element_id)
-            if not hasattr(element, property_name):
+        def _set(element: win32com.client.CDispatch) -> None:
+            # Без предварительного hasattr: pywin32 сам дает AttributeError для неизвестного свойства
+            try:
+                setattr(element, property_name, value)
+            except AttributeError:
                  raise exceptions.PropertyNotFoundException(
-                     f"Property '{property_name}' not found for element '{element_id}' (Type: {element.Type}). Cannot set value.")
-            setattr(element, property_name, value)
+                     "Property '%s' not found for element '%s' (Type: %s). Cannot set value.", property_name, element_id, _LazyComType(element))
+
+        try:
+            self._on_element(element_id, _set)
         except exceptions.PropertyNotFoundException:
              raise
         except Exception as e:
-            if "findById" in str(e) or "control could not be found" in str(e).lower():
+            if _is_not_found_error(e):
                 raise exceptions.ElementNotFoundException(f"Element '{element_id}' not found: {e}")
             else:
                 # Error might indicate property is read-only
-                raise exceptions.SapGuiComException(f"Error setting property '{property_name}' for element '{element_id}': {e}")
+                raise exceptions.SapGuiComException("Error setting property '%s' for element '%s': %s", property_name, element_id, e)
 
     def _dump_recursive(self, com_object: win32com.client.CDispatch, current_depth: int, max_depth: int) -> Dict[str, Any]:
-        """Internal recursive helper for dump_element_state."""
-        if current_depth > max_depth:
-            return {"..." : f"Max depth ({max_depth}) reached"}
-
-        state = {}
-        # Basic properties that are usually safe to read
-        safe_props = ['Id', 'Type', 'Name', 'Text', 'Changeable', 'ContainerType', 'ScreenLeft', 'ScreenTop', 'Width', 'Height', 'Tooltip', 'DefaultTooltip', 'IconName']
-        for prop in safe_props:
+        """Internal helper for dump_element_state (iterative DFS with an explicit stack)."""
+        root_state: Dict[str, Any] = {}
+        # (COM object, depth, dict to fill)
+        stack: List[Tuple[Any, int, Dict[str, Any]]] = [(com_object, current_depth, root_state)]
+        while stack:
+            node, depth, state = stack.pop()
+            if depth > max_depth:
+                state["..."] = f"Max depth ({max_depth}) reached"
+                continue
+
+            # Обычно у визуального элемента есть все _SAFE_PROPS: читаем их одним вызовом attrgetter
             try:
-                if hasattr(com_object, prop):
-                    state[prop] = getattr(com_object, prop)
-                # else:
-                #     state[prop] = "<Not Available>"
-            except Exception as e:
-                state[prop] = f"<Error Reading: {e}>"
-
-        # Attempt to read other properties (use with caution) - limited list for safety
-        other_props = ['selected', 'Left', 'Top'] # Add more cautiously if needed
-        for prop in other_props:
-             try:
-                 if hasattr(com_object, prop):
-                      state[prop] = getattr(com_object, prop)
-             except Exception as e:
-                  state[prop] = f"<Error Reading: {e}>"
-
-
-        # Handle Children recursively
-        if hasattr(com_object, "Children"):
+                state.update(zip(self._SAFE_PROPS, self._SAFE_GETTER(node)))
+            except Exception:
+                # Какого-то свойства нет или ошибка COM - читаем по одному
+                for prop in self._SAFE_PROPS:
+                    try:
+                        # Одно чтение по DISPID; отсутствующее свойство - AttributeError (без hasattr + getattr)
+                        state[prop] = _get_com_property(node, prop)
+                    except AttributeError:
+                        pass
+                        # state[prop] = "<Not Available>"
+                    except Exception as e:
+                        state[prop] = f"<Error Reading: {e}>"
+
+            for prop in self._OTHER_PROPS:
+                 try:
+                     state[prop] = _get_com_property(node, prop)
+                 except AttributeError:
+                     pass
+                 except Exception as e:
+                      state[prop] = f"<Error Reading: {e}>"
+
+
+            # Children: placeholders are appended in order, then filled when popped
             try:
-                children_count = getattr(com_object.Children, "Count", 0)
-                if children_count > 0:
-                    state["Children"] = []
-                    # Limit number of children dumped to avoid excessive output
-                    max_children_to_dump = 10
-                    for i in range(min(children_count, max_children_to_dump)):
-                         try:
-                             child = com_object.Children(i)
-                             child_state = self._dump_recursive(child, current_depth + 1, max_depth)
-                             state["Children"].append(child_state)
-                         except Exception as e_child:
-                              state["Children"].append({"Index": i, "Error": f"<Error Accessing Child: {e_child}>"})
-                    if children_count > max_children_to_dump:
-                         state["Children"].append({"..." : f"{children_count - max_children_to_dump} more children not shown"})
-
+                children_collection = _get_com_property(node, "Children")
+            except AttributeError:
+                children_collection = None # Не контейнер
             except Exception as e_children:
+                children_collection = None
                 state["Children"] = f"<Error Accessing Children: {e_children}>"
-
-        return state
-
-    def dump_element_state(self, element_id: str, recursive: bool = True, max_depth: int = 3, print_output: bool = True) -> Optional[Dict[str, Any]]:
+            if children_collection is not None:
+                try:
+                    children_count = getattr(children_collection, "Count", 0)
+                    if children_count > 0:
+                        children_states: List[Dict[str, Any]] = []
+                        state["Children"] = children_states
+                        pending = []
+                        # Limit number of children dumped to avoid excessive output
+                        max_children_to_dump = 10
+                        for i in range(min(children_count, max_children_to_dump)):
+                             try:
+                                 child = children_collection(i)
+                             except Exception as e_child:
+                                  children_states.append({"Index": i, "Error": f"<Error Accessing Child: {e_child}>"})
+                                  continue
+                             child_state: Dict[str, Any] = {}
+                             children_states.append(child_state)
+                             pending.append((child, depth + 1, child_state))
+                        if children_count > max_children_to_dump:
+                             children_states.append({"..." : f"{children_count - max_children_to_dump} more children not shown"})
+                        stack.extend(reversed(pending))
+
+                except Exception as e_children:
+                    state["Children"] = f"<Error Accessing Children: {e_children}>"
+
+        return root_state
+
+    def dump_element_state(self, element_id: str, recursive: bool = True, max_depth: int = 3, print_output: bool = True,
+                           pretty_style: str = 'json') -> Optional[Dict[str, Any]]:
         """
         Retrieves and optionally prints the state (properties and children) of an element.
         Useful for debugging and understanding element structure. Now uses _build_snapshot_recursive.
@@ -649,6 +1348,7 @@ class Window:
             recursive (bool): If True, recursively dumps child elements up to max_depth.
             max_depth (int): The maximum depth for recursive dumping.
             print_output (bool): If True, pretty-prints the dumped state to the console.
+            pretty_style (str): How to print: 'json' (indented JSON, fast for large trees) or 'pprint'.
 
         Returns:
             Optional[Dict[str, Any]]: A dictionary representing the element's state,
@@ -657,9 +1357,12 @@ class Window:
         Raises:
             exceptions.ElementNotFoundException: If the root element cannot be found.
             exceptions.SapGuiComException: For other COM errors during dumping.
+            ValueError: If pretty_style is not 'json' or 'pprint'.
         """
+        if pretty_style not in ('json', 'pprint'):
+            raise ValueError("Неверный pretty_style. Допустимые значения: 'json', 'pprint'.")
         try:
-            root_element = self.session_handle.findById(element_id)
+            root_element = self._find_live(element_id)
             actual_max_depth = max_depth if recursive else 0
 
             # Используем новый рекурсивный построитель, но с ограниченным набором свойств по умолчанию для скорости
@@ -674,7 +1377,11 @@ class Window:
 
             if print_output:
                 print(f"--- Dump State for Element '{element_id}' (Max Depth: {actual_max_depth}) ---")
-                pprint.pprint(dump_data, indent=2)
+                if pretty_style == 'json':
+                    print(_json_dumps(dump_data)) # json/orjson на C - намного быстрее pprint на больших деревьях
+                else:
+                    import pprint # Нужен только для печати
+                    pprint.pprint(dump_data, indent=2)
                 print(f"--- End Dump State for Element '{element_id}' ---")
                 return None
             else:
@@ -751,92 +1458,87 @@ class Window:
         popup_ids = popup_ids if popup_ids is not None else ["wnd[1]", "wnd[2]"]
         handled_successfully = False
 
-        for popup_id in popup_ids:
+        # ID кнопок для каждого окна строим один раз, до цикла проверки
+        popup_targets = [
+            (popup_id,
+             f"{popup_id}/{press_no_button_id}" if press_no_button_id else None,
+             f"{popup_id}/{press_button_id}" if press_button_id else None)
+            for popup_id in popup_ids
+        ]
+
+        for popup_id, full_no_button_id, full_button_id in popup_targets:
             try:
-                element_exists = False
-                try:
-                    self.session_handle.FindById(popup_id, False)
-                    element_exists = True
-                except Exception:
-                    element_exists = False
+                # FindById(id, False) возвращает None вместо COM-исключения, если окна нет (обычный случай)
+                popup_obj = self.session_handle.FindById(popup_id, False)
 
-                if element_exists:
+                if popup_obj is not None:
                     if log_details:
                         popup_title = ""
-                        try: popup_title = self.get_element_property(popup_id, "Text")
-                        except: pass
-                        log.warning(f"Обнаружено возможное всплывающее окно: {popup_id} (Заголовок: '{popup_title}')")
+                        try: popup_title = popup_obj.Text
+                        except pythoncom.com_error: pass
+                        log.warning("Обнаружено возможное всплывающее окно: %s (Заголовок: '%s')", popup_id, popup_title)
 
                     action_taken = False
 
                     # 1. Приоритет: Попытка нажать кнопку "Нет" (если указана)
-                    if press_no_button_id:
-                        full_no_button_id = f"{popup_id}/{press_no_button_id}"
+                    if full_no_button_id:
                         try:
-                            button_exists = False
-                            try:
-                                self.session_handle.FindById(full_no_button_id, False)
-                                button_exists = True
-                            except: pass
-
-                            if button_exists:
-                                self.press(full_no_button_id)
+                            button_obj = self.session_handle.FindById(full_no_button_id, False)
+
+                            if button_obj is not None:
+                                button_obj.press() # Кнопка уже найдена - без повторного findById в self.press
                                 if log_details:
-                                    log.info(f"Нажата кнопка 'Нет' (или аналог) '{full_no_button_id}' во всплывающем окне {popup_id}.")
+                                    log.info("Нажата кнопка 'Нет' (или аналог) '%s' во всплывающем окне %s.", full_no_button_id, popup_id)
                                 action_taken = True # Устанавливаем флаг, что действие выполнено
                             elif log_details:
-                                log.debug(f"Кнопка 'Нет' '{full_no_button_id}' не найдена в окне {popup_id}.")
-                        except Exception as btn_e:
+                                log.debug("Кнопка 'Нет' '%s' не найдена в окне %s.", full_no_button_id, popup_id)
+                        except pythoncom.com_error as btn_e:
                             if log_details:
-                                log.error(f"Ошибка при попытке нажать кнопку 'Нет' '{full_no_button_id}': {btn_e}")
+                                log.error("Ошибка при попытке нажать кнопку 'Нет' '%s': %s", full_no_button_id, btn_e)
 
                     # 2. Попытка нажать основную кнопку (если "Нет" не нажималась и кнопка указана)
-                    if not action_taken and press_button_id:
-                        full_button_id = f"{popup_id}/{press_button_id}"
+                    if not action_taken and full_button_id:
                         try:
-                            button_exists = False
-                            try:
-                                self.session_handle.FindById(full_button_id, False)
-                                button_exists = True
-                            except: pass
-
-                            if button_exists:
-                                self.press(full_button_id)
+                            button_obj = self.session_handle.FindById(full_button_id, False)
+
+                            if button_obj is not None:
+                                button_obj.press()
                                 if log_details:
-                                    log.info(f"Нажата основная кнопка '{full_button_id}' во всплывающем окне {popup_id}.")
+                                    log.info("Нажата основная кнопка '%s' во всплывающем окне %s.", full_button_id, popup_id)
                                 action_taken = True
                             elif log_details:
-                                log.debug(f"Основная кнопка '{full_button_id}' не найдена в окне {popup_id}.")
-                        except Exception as btn_e:
+                                log.debug("Основная кнопка '%s' не найдена в окне %s.", full_button_id, popup_id)
+                        except pythoncom.com_error as btn_e:
                             if log_details:
-                                log.error(f"Ошибка при попытке нажать основную кнопку '{full_button_id}': {btn_e}")
+                                log.error("Ошибка при попытке нажать основную кнопку '%s': %s", full_button_id, btn_e)
 
                     # 3. Попытка отправить VKey (если никакая кнопка не нажималась и VKey указан)
                     if not action_taken and action_vkey is not None:
                         try:
                             self.send_v_key(element=popup_id, value=action_vkey)
                             if log_details:
-                                log.info(f"Отправлен VKey {action_vkey} во всплывающее окно {popup_id}.")
+                                log.info("Отправлен VKey %s во всплывающее окно %s.", action_vkey, popup_id)
                             action_taken = True
-                        except Exception as vkey_e:
+                        except exceptions.ActionException as vkey_e:
                             if log_details:
-                                log.error(f"Ошибка при отправке VKey {action_vkey} в окно {popup_id}: {vkey_e}")
+                                log.error("Ошибка при отправке VKey %s в окно %s: %s", action_vkey, popup_id, vkey_e)
 
                     # Финальная проверка и выход из цикла, если успешно обработали
                     if action_taken:
                         handled_successfully = True
+                        self.invalidate_cache() # Окно закрыто/экран сменился - ссылки из кэша устарели
                         if wait_after_action > 0:
                             if log_details:
-                                log.debug(f"Пауза {wait_after_action} сек после обработки окна {popup_id}.")
+                                log.debug("Пауза %s сек после обработки окна %s.", wait_after_action, popup_id)
                             time.sleep(wait_after_action)
                         break # Обработали первое найденное окно, выходим
                     elif log_details:
                          # Это сообщение теперь менее критично, т.к. могло быть не найдено указанных кнопок
-                        log.debug(f"Не удалось выполнить настроенное действие (кнопки/VKey) для окна {popup_id}.")
+                        log.debug("Не удалось выполнить настроенное действие (кнопки/VKey) для окна %s.", popup_id)
 
             except Exception as outer_e:
                 if log_details:
-                    log.error(f"Критическая ошибка при проверке/обработке окна {popup_id}: {outer_e}")
+                    log.error("Критическая ошибка при проверке/обработке окна %s: %s", popup_id, outer_e)
 
         return handled_successfully
 
@@ -854,7 +1556,7 @@ class Window:
         начиная с указанного корневого элемента, и сохраняет его в файл.
 
         Args:
-            filepath (Union[str, Path]): Путь к файлу для сохранения (JSON или YAML).
+            filepath (Union[str, Path]): Путь к файлу для сохранения (JSON, YAML или MessagePack).
             root_element_id (str): ID корневого элемента для начала сканирования. По умолчанию "wnd[0]".
             max_depth (Optional[int]): Максимальная глубина рекурсии. None - без ограничений.
             properties_to_include (Optional[List[str]]): Список имен свойств для включения.
@@ -862,70 +1564,44 @@ class Window:
                                                          (кроме исключенных).
             properties_to_exclude (Optional[List[str]]): Список имен свойств для явного исключения.
                                                          Полезно для пропуска "шумных" или проблемных свойств.
-            output_format (str): Формат вывода: 'json' или 'yaml'. По умолчанию 'json'.
+            output_format (str): Формат вывода: 'json', 'yaml' или 'msgpack' (бинарный, компактнее). По умолчанию 'json'.
             include_children (bool): Включать ли дочерние элементы рекурсивно. По умолчанию True.
 
         Raises:
             exceptions.ElementNotFoundException: Если корневой элемент не найден.
             exceptions.SapGuiComException: При других ошибках COM во время сканирования.
-            ValueError: Если указан неверный output_format или yaml не установлен.
+            ValueError: Если указан неверный output_format или не установлена нужная для него библиотека (PyYAML, msgpack).
             IOError: При ошибках записи файла.
         """
-        log.info(f"Создание слепка GUI для элемента '{root_element_id}' -> {filepath}")
+        log.info("Создание слепка GUI для элемента '%s' -> %s", root_element_id, filepath)
         start_time = time.time()
 
-        if output_format.lower() not in ['json', 'yaml']:
-            raise ValueError("Неверный output_format. Допустимые значения: 'json', 'yaml'.")
-        if output_format.lower() == 'yaml' and yaml is None:
-            raise ValueError("Для формата 'yaml' необходимо установить библиотеку PyYAML: pip install pyyaml")
+        writer = _get_snapshot_writer(output_format)
 
         # --- Получаем корневой COM-объект ---
         try:
-            root_com_object = self.session_handle.findById(root_element_id)
+            root_com_object = self._find_live(root_element_id)
         except Exception as e:
-            if "findById" in str(e) or "control could not be found" in str(e).lower():
+            if _is_not_found_error(e):
                 raise exceptions.ElementNotFoundException(f"Корневой элемент '{root_element_id}' не найден: {e}")
             else:
                 raise exceptions.SapGuiComException(f"Ошибка доступа к корневому элементу '{root_element_id}': {e}")
 
-        # --- Запускаем рекурсивный сбор данных ---
-        try:
-            snapshot_data = self._build_snapshot_recursive(
-                com_object=root_com_object,
-                current_depth=0,
-                max_depth=max_depth if include_children else 0, # Если дети не нужны, глубина 0
-                props_include=properties_to_include,
-                props_exclude=properties_to_exclude if properties_to_exclude else [] # Убедимся, что это список
-            )
-        except Exception as e_dump:
-             # Ловим ошибки, возникшие при рекурсивном обходе
-             log.exception(f"Ошибка во время рекурсивного сбора данных для слепка: {e_dump}")
-             raise exceptions.SapGuiComException(f"Ошибка сбора данных для слепка: {e_dump}") from e_dump
+        # --- Обход дерева и сохранение в файл ---
+        events = _guard_snapshot_walk(self._walk_snapshot(
+            com_object=root_com_object,
+            current_depth=0,
+            max_depth=max_depth if include_children else 0, # Если дети не нужны, глубина 0
+            props_include=properties_to_include,
+            props_exclude=properties_to_exclude if properties_to_exclude else [] # Убедимся, что это список
+        ))
+        if writer is _write_json:
+            # JSON пишется по мере обхода: полный словарь слепка в памяти не строится
+            saved_path = _save_snapshot(events, filepath, _write_json_events)
+        else:
+            saved_path = _save_snapshot(_snapshot_from_events(events), filepath, writer)
+        log.info("Слепок GUI успешно сохранен в '%s'. Время: %.2f сек.", saved_path, time.time() - start_time)
 
-        # --- Сохраняем в файл ---
-        file_path_obj = Path(filepath)
-        try:
-            # Создаем родительские директории
-            file_path_obj.parent.mkdir(parents=True, exist_ok=True)
-
-            with open(file_path_obj, 'w', encoding='utf-8') as f:
-                if output_format.lower() == 'json':
-                    json.dump(snapshot_data, f, indent=2, ensure_ascii=False, default=str) # default=str для несериализуемых типов
-                elif output_format.lower() == 'yaml':
-                    # Используем Dumper=yaml.SafeDumper или просто dump, если безопасность не критична
-                    # allow_unicode=True важно для не-ASCII символов
-                    yaml.dump(snapshot_data, f, allow_unicode=True, indent=2, default_flow_style=False, sort_keys=False)
-
-            end_time = time.time()
-            log.info(f"Слепок GUI успешно сохранен в '{file_path_obj.resolve()}'. Время: {end_time - start_time:.2f} сек.")
-
-        except IOError as e_io:
-            log.error(f"Ошибка записи файла слепка '{filepath}': {e_io}")
-            raise
-        except Exception as e_save:
-            log.error(f"Неожиданная ошибка при сохранении файла слепка '{filepath}': {e_save}")
-            raise
-        
     def _build_snapshot_recursive(self,
                                   com_object: Any,
                                   current_depth: int,
@@ -933,13 +1609,109 @@ class Window:
                                   props_include: Optional[List[str]],
                                   props_exclude: List[str]
                                   ) -> Dict[str, Any]:
-        """Внутренний рекурсивный метод для построения словаря слепка."""
-        if max_depth is not None and current_depth > max_depth:
-            # Если есть ID, возвращаем его и маркер глубины
-            try: id_val = getattr(com_object, "Id", "<No ID>")
-            except: id_val = "<Error Reading ID>"
-            return {"Id": id_val, "__Status__": f"Max depth ({max_depth}) reached"}
+        """
+        Внутренний метод для построения словаря слепка com_object и его потомков.
+        Обход итеративный (см. _walk_snapshot), без рекурсии Python.
+        """
+        return _snapshot_from_events(self._walk_snapshot(com_object, current_depth, max_depth, props_include, props_exclude))
+
+    def _walk_snapshot(self,
+                       com_object: Any,
+                       current_depth: int,
+                       max_depth: Optional[int],
+                       props_include: Optional[List[str]],
+                       props_exclude: List[str]
+                       ) -> Generator[Tuple[Any, ...], None, None]:
+        """ События обхода (см. _walk_com_tree) для слепка со свойствами из dir()/props_include. """
+        excluded = frozenset(props_exclude) # Проверки "in" для каждого свойства каждого элемента
+        return self._walk_com_tree(com_object, current_depth, max_depth,
+                                   lambda node: self._read_snapshot_properties(node, props_include, excluded))
+
+    def _walk_com_tree(self,
+                       com_object: Any,
+                       current_depth: int,
+                       max_depth: Optional[int],
+                       read_properties: Callable[[Any], Dict[str, Any]]
+                       ) -> Generator[Tuple[Any, ...], None, None]:
+        """
+        Обходит com_object и его потомков в глубину (DFS с явным стеком) и выдает события:
+        ("open", данные_элемента, есть_дети) и ("close", есть_дети). Дочерние элементы идут
+        между "open" и "close" родителя в исходном порядке. В памяти держится только стек обхода.
+        Свойства одного элемента читает read_properties.
+        """
+        # ("node", COM-объект, глубина, индекс у родителя или None для корня) | ("error", данные) | ("close", есть_дети)
+        stack: List[Tuple[Any, ...]] = [("node", com_object, current_depth, None)]
+        while stack:
+            entry = stack.pop()
+            if entry[0] == "close":
+                yield entry
+                continue
+            if entry[0] == "error":
+                yield ("open", entry[1], False)
+                yield ("close", False)
+                continue
+
+            _, node, depth, index = entry
+            if max_depth is not None and depth > max_depth:
+                # Если есть ID, возвращаем его и маркер глубины
+                try: id_val = getattr(node, "Id", "<No ID>")
+                except pythoncom.com_error: id_val = "<Error Reading ID>"
+                yield ("open", {"Id": id_val, "__Status__": f"Max depth ({max_depth}) reached"}, False)
+                yield ("close", False)
+                continue
 
+            try:
+                element_data = read_properties(node)
+            except Exception as e_child:
+                if index is None:
+                    raise
+                yield ("open", {"__Index__": index, "__Error__": f"<Error Accessing/Processing Child: {type(e_child).__name__}>"}, False)
+                yield ("close", False)
+                continue
+
+            # "Children" в слепке - только дочерние элементы обхода; прочитанное как свойство значение
+            # дало бы второй ключ "Children" в потоковом JSON
+            element_data.pop("Children", None)
+
+            # --- Дочерние элементы ---
+            pending: List[Tuple[Any, ...]] = []
+            if max_depth is None or depth < max_depth:
+                try:
+                    try:
+                        children_collection = _get_com_property(node, "Children")
+                    except AttributeError:
+                        children_collection = None # Не контейнер
+                    children_count = getattr(children_collection, "Count", 0) if children_collection is not None else 0
+                    if children_count > 0:
+                        # Одно перечисление коллекции вместо вызова children_collection(i) на каждый индекс
+                        children = _enumerate_children(children_collection, children_count)
+                        if children is not None:
+                            # Обычный случай: все дети уже получены, без try на каждого
+                            pending = [("node", child, depth + 1, i) for i, child in enumerate(children)]
+                        else:
+                            # Перечисление не удалось - доступ по индексу, ошибки отдельных детей записываем
+                            for i in range(children_count):
+                                try:
+                                    child_com_object = children_collection(i)
+                                except pythoncom.com_error as e_child:
+                                    pending.append(("error", {"__Index__": i, "__Error__": f"<Error Accessing/Processing Child: {type(e_child).__name__}>"}))
+                                    continue
+                                pending.append(("node", child_com_object, depth + 1, i))
+                except Exception as e_children:
+                    pending = []
+                    element_data["Children"] = f"<Error Accessing Children Collection: {type(e_children).__name__}>"
+
+            has_children = bool(pending)
+            yield ("open", element_data, has_children)
+            stack.append(("close", has_children))
+            stack.extend(reversed(pending)) # Первый ребенок обрабатывается первым
+
+    def _read_snapshot_properties(self,
+                                  com_object: Any,
+                                  props_include: Optional[List[str]],
+                                  props_exclude: Collection[str]
+                                  ) -> Dict[str, Any]:
+        """Читает свойства одного элемента для слепка (без дочерних элементов)."""
         element_data: Dict[str, Any] = {}
         property_names_to_try: List[str] = []
 
@@ -949,72 +1721,49 @@ class Window:
         else:
             # Пытаемся получить все атрибуты через dir(), фильтруем ненужные
             try:
+                # dir() уже возвращает уникальные имена по алфавиту - отдельная сортировка не нужна
                 all_attrs = dir(com_object)
-                potential_props = [
+                property_names_to_try = [
                     p for p in all_attrs
                     if not p.startswith('_') # Убираем внутренние
                     and p not in props_exclude # Убираем явно исключенные
                     # Попытка отфильтровать методы (не всегда надежно для COM)
                     # and not callable(getattr(com_object, p, None))
                 ]
-                # Добавляем стандартные важные свойства, если их нет в dir()
-                standard_props = ['Id', 'Type', 'Name', 'Text', 'Tooltip', 'Changeable', 'ContainerType', 'ScreenLeft', 'ScreenTop', 'Width', 'Height', 'DefaultTooltip', 'IconName', 'ClassName']
-                for sp in standard_props:
-                     if sp not in potential_props and sp not in props_exclude:
-                         potential_props.append(sp)
-                property_names_to_try = sorted(list(set(potential_props))) # Уникальные и сортированные
+                # Добавляем стандартные важные свойства, если их нет в dir() (редко; тогда сортируем заново)
+                missing_standard = _SNAPSHOT_STANDARD_PROPS_SET.difference(all_attrs, props_exclude)
+                if missing_standard:
+                    property_names_to_try = sorted(property_names_to_try + list(missing_standard))
 
             except Exception as e_dir:
-                log.warning(f"Не удалось получить атрибуты через dir() для объекта: {e_dir}. Используем только стандартный набор.")
+                log.warning("Не удалось получить атрибуты через dir() для объекта: %s. Используем только стандартный набор.", e_dir)
                 # Fallback на стандартный набор, если dir() не сработал
-                standard_props = ['Id', 'Type', 'Name', 'Text', 'Tooltip', 'Changeable', 'ContainerType', 'ScreenLeft', 'ScreenTop', 'Width', 'Height', 'DefaultTooltip', 'IconName', 'ClassName']
-                property_names_to_try = [p for p in standard_props if p not in props_exclude]
+                property_names_to_try = [p for p in _SNAPSHOT_STANDARD_PROPS if p not in props_exclude]
 
 
         # --- Читаем выбранные свойства ---
         for prop_name in property_names_to_try:
             try:
-                # Используем hasattr для проверки перед чтением (доп. защита)
-                if hasattr(com_object, prop_name):
-                    value = getattr(com_object, prop_name)
-                    # Пытаемся обработать COM коллекции (простой случай)
-                    if isinstance(value, win32com.client.CDispatch) and hasattr(value, 'Count') and hasattr(value, 'Item'):
-                         try:
-                              element_data[prop_name] = [value.Item(i) for i in range(value.Count)]
-                         except Exception:
-                              element_data[prop_name] = "<Error Reading COM Collection>"
-                    else:
-                         element_data[prop_name] = value
-                # else: # Не добавляем свойство, если его нет
-                #    pass
-            except Exception as e_prop:
+                # Одно чтение по DISPID вместо hasattr + getattr
+                value = _get_com_property(com_object, prop_name)
+                # Пытаемся обработать COM коллекции (простой случай)
+                count = _com_collection_count(value)
+                if count is not None:
+                     try:
+                          element_data[prop_name] = [value.Item(i) for i in range(count)]
+                     except pythoncom.com_error:
+                          element_data[prop_name] = "<Error Reading COM Collection>"
+                     except AttributeError:
+                          element_data[prop_name] = value # Count без Item - не коллекция
+                else:
+                     element_data[prop_name] = value
+            except AttributeError:
+                pass # Не добавляем свойство, если его нет
+            except pythoncom.com_error as e_prop:
                 element_data[prop_name] = f"<Error Reading Property: {type(e_prop).__name__}>"
 
-        # --- Рекурсивно обрабатываем дочерние элементы ---
-        if (max_depth is None or current_depth < max_depth) and hasattr(com_object, "Children"):
-            try:
-                children_collection = getattr(com_object, "Children", None)
-                if children_collection and hasattr(children_collection, "Count"):
-                    children_count = children_collection.Count
-                    if children_count > 0:
-                        element_data["Children"] = []
-                        for i in range(children_count):
-                            try:
-                                child_com_object = children_collection(i) # Доступ к дочернему элементу
-                                child_data = self._build_snapshot_recursive(
-                                    com_object=child_com_object,
-                                    current_depth=current_depth + 1,
-                                    max_depth=max_depth,
-                                    props_include=props_include,
-                                    props_exclude=props_exclude
-                                )
-                                element_data["Children"].append(child_data)
-                            except Exception as e_child:
-                                element_data["Children"].append({"__Index__": i, "__Error__": f"<Error Accessing/Processing Child: {type(e_child).__name__}>"})
-            except Exception as e_children:
-                element_data["Children"] = f"<Error Accessing Children Collection: {type(e_children).__name__}>"
-
         return element_data
+
     def save_gui_snapshot_from_schema(self,
                                       filepath: Union[str, Path],
                                       object_schema: Dict[str, Any], # Загруженный sap_gui_objects.json
@@ -1023,83 +1772,66 @@ class Window:
                                       max_depth: Optional[int] = None, # None = Без ограничений
                                       properties_to_exclude: Optional[List[str]] = None, # Свойства, которые не надо сохранять
                                       output_format: str = 'json',
-                                      include_children: bool = True
+                                      include_children: bool = True,
+                                      properties_to_include: Optional[List[str]] = None # Только эти свойства, схема не используется
                                       ) -> None:
         """
         Создает "слепок" GUI-элементов, используя ЗАДАННУЮ СХЕМУ для определения
         свойств, которые нужно попытаться прочитать.
 
         Args:
-            filepath (Union[str, Path]): Путь к файлу для сохранения (JSON или YAML).
+            filepath (Union[str, Path]): Путь к файлу для сохранения (JSON, YAML или MessagePack).
             object_schema (Dict[str, Any]): Словарь, загруженный из JSON-файла с описанием
                                             методов и свойств объектов (sap_gui_objects.json).
             root_element_id (str): ID корневого элемента для начала сканирования. По умолчанию "wnd[0]".
             max_depth (Optional[int]): Максимальная глубина рекурсии. None - без ограничений.
             properties_to_exclude (Optional[List[str]]): Список имен свойств для явного исключения
                                                          из чтения (даже если они есть в схеме).
-            output_format (str): Формат вывода: 'json' или 'yaml'. По умолчанию 'json'.
+            output_format (str): Формат вывода: 'json', 'yaml' или 'msgpack' (бинарный, компактнее). По умолчанию 'json'.
             include_children (bool): Включать ли дочерние элементы рекурсивно. По умолчанию True.
+            properties_to_include (Optional[List[str]]): Явный список свойств для всех элементов.
+                                                         Если задан, поиск свойств по схеме пропускается.
 
         Raises:
             exceptions.ElementNotFoundException: Если корневой элемент не найден.
             exceptions.SapGuiComException: При других ошибках COM во время сканирования.
-            ValueError: Если указан неверный output_format, yaml не установлен, или схема не передана.
+            ValueError: Если указан неверный output_format, не установлена нужная для него библиотека (PyYAML, msgpack), или схема не передана.
             KeyError: Если тип элемента не найден в переданной object_schema.
             IOError: При ошибках записи файла.
         """
-        log.info(f"Создание слепка GUI по СХЕМЕ для элемента '{root_element_id}' -> {filepath}")
+        log.info("Создание слепка GUI по СХЕМЕ для элемента '%s' -> %s", root_element_id, filepath)
         start_time = time.time()
 
         if not object_schema:
              raise ValueError("Необходимо передать object_schema (загруженный sap_gui_objects.json).")
-        if output_format.lower() not in ['json', 'yaml']:
-            raise ValueError("Неверный output_format. Допустимые значения: 'json', 'yaml'.")
-        if output_format.lower() == 'yaml' and yaml is None:
-            raise ValueError("Для формата 'yaml' необходимо установить библиотеку PyYAML: pip install pyyaml")
+        writer = _get_snapshot_writer(output_format)
 
         props_exclude_list = properties_to_exclude if properties_to_exclude else []
 
         # --- Получаем корневой COM-объект ---
         try:
-            root_com_object = self.session_handle.findById(root_element_id)
+            root_com_object = self._find_live(root_element_id)
         except Exception as e:
-            if "findById" in str(e) or "control could not be found" in str(e).lower():
+            if _is_not_found_error(e):
                 raise exceptions.ElementNotFoundException(f"Корневой элемент '{root_element_id}' не найден: {e}")
             else:
                 raise exceptions.SapGuiComException(f"Ошибка доступа к корневому элементу '{root_element_id}': {e}")
 
-        # --- Запускаем рекурсивный сбор данных по схеме ---
-        try:
-            snapshot_data = self._build_snapshot_from_schema_recursive(
-                com_object=root_com_object,
-                current_depth=0,
-                max_depth=max_depth if include_children else 0,
-                object_schema=object_schema,
-                props_exclude=props_exclude_list
-            )
-        except Exception as e_dump:
-             log.exception(f"Ошибка во время рекурсивного сбора данных для слепка по схеме: {e_dump}")
-             raise exceptions.SapGuiComException(f"Ошибка сбора данных для слепка по схеме: {e_dump}") from e_dump
-
-        # --- Сохраняем в файл ---
-        file_path_obj = Path(filepath)
-        try:
-            file_path_obj.parent.mkdir(parents=True, exist_ok=True)
-            with open(file_path_obj, 'w', encoding='utf-8') as f:
-                if output_format.lower() == 'json':
-                    json.dump(snapshot_data, f, indent=2, ensure_ascii=False, default=str)
-                elif output_format.lower() == 'yaml':
-                    yaml.dump(snapshot_data, f, allow_unicode=True, indent=2, default_flow_style=False, sort_keys=False)
-
-            end_time = time.time()
-            log.info(f"Слепок GUI по СХЕМЕ успешно сохранен в '{file_path_obj.resolve()}'. Время: {end_time - start_time:.2f} сек.")
-
-        except IOError as e_io:
-            log.error(f"Ошибка записи файла слепка '{filepath}': {e_io}")
-            raise
-        except Exception as e_save:
-            log.error(f"Неожиданная ошибка при сохранении файла слепка '{filepath}': {e_save}")
-            raise
+        # --- Обход дерева по схеме и сохранение в файл ---
+        events = _guard_snapshot_walk(self._walk_snapshot_from_schema(
+            com_object=root_com_object,
+            current_depth=0,
+            max_depth=max_depth if include_children else 0,
+            object_schema=object_schema,
+            props_exclude=props_exclude_list,
+            props_include=properties_to_include
+        ))
+        if writer is _write_json:
+            # JSON пишется по мере обхода: полный словарь слепка в памяти не строится
+            saved_path = _save_snapshot(events, filepath, _write_json_events)
+        else:
+            saved_path = _save_snapshot(_snapshot_from_events(events), filepath, writer)
+        log.info("Слепок GUI по СХЕМЕ успешно сохранен в '%s'. Время: %.2f сек.", saved_path, time.time() - start_time)
 
 
     def _build_snapshot_from_schema_recursive(self,
@@ -1107,115 +1839,181 @@ class Window:
                                               current_depth: int,
                                               max_depth: Optional[int],
                                               object_schema: Dict[str, Any],
-                                              props_exclude: List[str]
+                                              props_exclude: List[str],
+                                              props_include: Optional[List[str]] = None
                                               ) -> Dict[str, Any]:
-        """Внутренний рекурсивный метод для построения словаря слепка ПО СХЕМЕ."""
-        if max_depth is not None and current_depth > max_depth:
-            try: id_val = getattr(com_object, "Id", "<No ID>")
-            except: id_val = "<Error Reading ID>"
-            return {"Id": id_val, "__Status__": f"Max depth ({max_depth}) reached"}
-
+        """Внутренний метод для построения словаря слепка ПО СХЕМЕ (итеративный обход, см. _walk_com_tree)."""
+        return _snapshot_from_events(self._walk_snapshot_from_schema(
+            com_object, current_depth, max_depth, object_schema, props_exclude, props_include))
+
+    def _walk_snapshot_from_schema(self,
+                                   com_object: Any,
+                                   current_depth: int,
+                                   max_depth: Optional[int],
+                                   object_schema: Dict[str, Any],
+                                   props_exclude: List[str],
+                                   props_include: Optional[List[str]] = None
+                                   ) -> Generator[Tuple[Any, ...], None, None]:
+        """ События обхода (см. _walk_com_tree) для слепка ПО СХЕМЕ. """
+        excluded = frozenset(props_exclude)
+        # Тип элемента -> (имена свойств для чтения, DISPID по имени); на один обход
+        type_cache: Dict[str, Tuple[List[str], Dict[str, Optional[int]], List[int]]] = {}
+        return self._walk_com_tree(com_object, current_depth, max_depth,
+                                   lambda node: self._read_schema_properties(node, object_schema, excluded, type_cache, props_include))
+
+    def _read_schema_properties(self,
+                                com_object: Any,
+                                object_schema: Dict[str, Any],
+                                props_exclude: Collection[str],
+                                type_cache: Optional[Dict[str, Tuple[List[str], Dict[str, Optional[int]], List[int]]]] = None,
+                                props_include: Optional[List[str]] = None
+                                ) -> Dict[str, Any]:
+        """
+        Читает свойства одного элемента, перечисленные в схеме для его типа (без дочерних элементов).
+        Если задан props_include, читаются только эти свойства, схема не используется.
+        type_cache хранит между вызовами список имен и DISPID для каждого типа; когда все
+        DISPID типа известны, значения читаются одним пакетом без поштучной обработки ошибок.
+        """
+        if type_cache is None:
+            type_cache = {}
         element_data: Dict[str, Any] = {}
         element_type: Optional[str] = None
         schema_properties: List[Dict[str, Any]] = [] # Список словарей свойств из схемы
 
         # --- Пытаемся определить тип элемента ---
         try:
-            element_type = getattr(com_object, "Type")
+            element_type = _get_com_property(com_object, "Type")
             element_data["Type"] = element_type # Сохраняем тип в любом случае
-        except Exception as e_type:
+        except (pythoncom.com_error, AttributeError) as e_type:
             element_data["Type"] = f"<Error Reading Type: {type(e_type).__name__}>"
-            log.warning(f"Не удалось прочитать тип элемента: {e_type}")
+            log.warning("Не удалось прочитать тип элемента: %s", e_type)
             # Не можем продолжить поиск по схеме без типа
 
-        # --- Ищем свойства в схеме по типу ---
-        if element_type:
-            schema_key = f"{element_type} Object" # Формируем ключ для поиска в схеме
-            type_schema = object_schema.get(schema_key)
-
-            if type_schema and isinstance(type_schema.get("properties"), list):
-                schema_properties = type_schema["properties"]
-                log.debug(f"Найдены свойства в схеме для типа '{element_type}'.")
-            else:
-                log.warning(f"Схема для типа '{element_type}' (ключ '{schema_key}') не найдена или не содержит список 'properties' в object_schema.")
-                # Fallback: Попытаемся прочитать хотя бы базовые свойства
-                basic_props = ['Id', 'Name', 'Text', 'Tooltip', 'Changeable', 'ScreenLeft', 'ScreenTop', 'Width', 'Height']
-                schema_properties = [{"name": p} for p in basic_props] # Формируем структуру как в схеме
-
-        # --- Читаем свойства, определенные в схеме (или базовые) ---
-        property_names_to_try = [
-            prop.get("name") for prop in schema_properties
-            if prop.get("name") and prop.get("name") not in props_exclude
-        ]
-
-        # Всегда пытаемся прочитать ID, даже если его нет в списке (он ключевой)
-        if "Id" not in property_names_to_try and "Id" not in props_exclude:
-             property_names_to_try.insert(0, "Id")
+        # --- Ищем свойства в схеме по типу (один раз на тип за обход) ---
+        cached = type_cache.get(element_type) if element_type else None
+        if cached is None and props_include is not None:
+            # Явный список свойств от вызывающего: поиск в схеме не нужен
+            cached = ([p for p in props_include if p not in props_exclude and p != "Children"], {}, [])
+            if element_type:
+                type_cache[element_type] = cached
+        if cached is None:
+            if element_type:
+                schema_key = f"{element_type} Object" # Формируем ключ для поиска в схеме
+                type_schema = object_schema.get(schema_key)
+
+                if type_schema and isinstance(type_schema.get("properties"), list):
+                    schema_properties = type_schema["properties"]
+                    log.debug("Найдены свойства в схеме для типа '%s'.", element_type)
+                else:
+                    log.warning("Схема для типа '%s' (ключ '%s') не найдена или не содержит список 'properties' в object_schema.", element_type, schema_key)
+                    # Fallback: Попытаемся прочитать хотя бы базовые свойства
+                    basic_props = ['Id', 'Name', 'Text', 'Tooltip', 'Changeable', 'ScreenLeft', 'ScreenTop', 'Width', 'Height']
+                    schema_properties = [{"name": p} for p in basic_props] # Формируем структуру как в схеме
+
+            # --- Читаем свойства, определенные в схеме (или базовые) ---
+            # "Children" не читаем как свойство: этот ключ слепка заполняет обход дочерних элементов
+            property_names_to_try = [
+                prop.get("name") for prop in schema_properties
+                if prop.get("name") and prop.get("name") not in props_exclude and prop.get("name") != "Children"
+            ]
+
+            # Всегда пытаемся прочитать ID, даже если его нет в списке (он ключевой)
+            if "Id" not in property_names_to_try and "Id" not in props_exclude:
+                 property_names_to_try.insert(0, "Id")
+
+            cached = (property_names_to_try, {}, [])
+            if element_type:
+                type_cache[element_type] = cached
+        property_names_to_try, dispids, batch_dispids = cached
+
+        # --- Быстрый путь: все свойства типа уже разрешены, читаем их одним пакетом ---
+        if batch_dispids:
+            try:
+                values = [_invoke_property_get(com_object, dispid) for dispid in batch_dispids]
+            except (pythoncom.com_error, AttributeError):
+                values = None # Fallback на поштучное чтение ниже
+            if values is not None:
+                # Одно update() по готовым парам; простые значения (не COM-объекты) - без вызова конвертера
+                element_data.update([
+                    (prop_name, self._schema_property_value(prop_name, value)
+                     if isinstance(value, _CDispatch) else value)
+                    for prop_name, value in zip(property_names_to_try, values)
+                ])
+                return element_data
 
         for prop_name in property_names_to_try:
             try:
-                # Используем get_element_property, который уже имеет защиту hasattr
-                # или просто getattr с try-except
-                # if hasattr(com_object, prop_name): # Доп. проверка не помешает
-                value = getattr(com_object, prop_name)
-
-                # Обработка COM коллекций (как в предыдущем методе)
-                if isinstance(value, win32com.client.CDispatch) and hasattr(value, 'Count') and hasattr(value, 'Item'):
-                    try:
-                        # Ограничим количество элементов коллекции для производительности
-                        count = value.Count
-                        max_coll_items = 50
-                        items = []
-                        for i in range(min(count, max_coll_items)):
-                             # Пытаемся получить простое представление элемента коллекции
-                             item_val = value.Item(i)
-                             if isinstance(item_val, win32com.client.CDispatch):
-                                  # Если это сложный объект, берем его ID или текст
-                                  items.append(getattr(item_val, 'Id', getattr(item_val, 'Text', str(item_val))))
-                             else:
-                                  items.append(item_val)
-
-                        element_data[prop_name] = items
-                        if count > max_coll_items:
-                            element_data[prop_name].append(f"... ({count - max_coll_items} more items)")
-
-                    except Exception as e_coll:
-                         element_data[prop_name] = f"<Error Reading COM Collection '{prop_name}': {type(e_coll).__name__}>"
-                else:
-                    element_data[prop_name] = value
+                # DISPID берем из кэша типа: GetIDsOfNames - один раз на тип, далее только Invoke
+                value = _get_com_property_by_type(com_object, prop_name, dispids)
+                element_data[prop_name] = self._schema_property_value(prop_name, value)
                 # else:
                 #    log.debug(f"Свойство '{prop_name}' отсутствует у объекта типа '{element_type}', хотя ожидалось по схеме.")
 
-            except Exception as e_prop:
+            except (pythoncom.com_error, AttributeError) as e_prop:
                 element_data[prop_name] = f"<Error Reading Property: {type(e_prop).__name__}>"
 
-        # --- Рекурсивно обрабатываем дочерние элементы ---
-        if (max_depth is None or current_depth < max_depth) and hasattr(com_object, "Children"):
-            try:
-                children_collection = getattr(com_object, "Children", None)
-                if children_collection and hasattr(children_collection, "Count"):
-                    children_count = children_collection.Count
-                    if children_count > 0:
-                        element_data["Children"] = []
-                        for i in range(children_count):
-                            try:
-                                child_com_object = children_collection(i)
-                                child_data = self._build_snapshot_from_schema_recursive(
-                                    com_object=child_com_object,
-                                    current_depth=current_depth + 1,
-                                    max_depth=max_depth,
-                                    object_schema=object_schema,
-                                    props_exclude=props_exclude
-                                )
-                                element_data["Children"].append(child_data)
-                            except Exception as e_child:
-                                element_data["Children"].append({"__Index__": i, "__Error__": f"<Error Accessing/Processing Child: {type(e_child).__name__}>"})
-            except Exception as e_children:
-                element_data["Children"] = f"<Error Accessing Children Collection: {type(e_children).__name__}>"
+        # Все имена типа разрешились в DISPID - следующие элементы пойдут пакетом
+        if (not batch_dispids and property_names_to_try and len(dispids) == len(property_names_to_try)
+                and None not in dispids.values()):
+            batch_dispids[:] = [dispids[name] for name in property_names_to_try]
 
         return element_data
 
-    def find_element_id_by_locator(self, locator_str: str, target_element_types: Optional[List[str]] = None) -> Optional[str]:
+    @staticmethod
+    def _schema_property_value(prop_name: str, value: Any) -> Any:
+        """Приводит значение свойства из схемы к сериализуемому виду (COM коллекции -> список)."""
+        # Обработка COM коллекций (как в предыдущем методе)
+        try:
+            count = _com_collection_count(value)
+        except pythoncom.com_error as e_coll:
+            return f"<Error Reading COM Collection '{prop_name}': {type(e_coll).__name__}>"
+        if count is not None:
+            try:
+                # Ограничим количество элементов коллекции для производительности
+                max_coll_items = 50
+                limit = min(count, max_coll_items)
+                # Первые limit элементов - одним IEnumVARIANT::Next(limit); Item(i) - только если перечисление недоступно
+                raw_items = _enumerate_children(value, limit) if limit else []
+                if raw_items is None:
+                    raw_items = [value.Item(i) for i in range(limit)]
+                else:
+                    del raw_items[limit:] # Fallback _NewEnum() отдает коллекцию целиком
+                # Коллекции однородны: путь выбираем по первому элементу, а не проверкой каждого
+                if raw_items and isinstance(raw_items[0], _CDispatch):
+                    # Сложные объекты: берем их ID или текст
+                    items = [item_val if not isinstance(item_val, _CDispatch)
+                             else getattr(item_val, 'Id', getattr(item_val, 'Text', str(item_val)))
+                             for item_val in raw_items]
+                else:
+                    items = raw_items
+
+                if count > max_coll_items:
+                    items.append(f"... ({count - max_coll_items} more items)")
+                return items
+
+            except pythoncom.com_error as e_coll:
+                 return f"<Error Reading COM Collection '{prop_name}': {type(e_coll).__name__}>"
+            except AttributeError:
+                 return value # Count без Item - не коллекция
+        return value
+
+    def _get_cached_locator(self, key: Tuple[str, Optional[Tuple[str, ...]]]) -> Optional[str]:
+        """ Returns the cached element ID for a locator key if the element still exists, else drops the entry. """
+        cache = self._locator_cache
+        element_id = cache.get(key)
+        if element_id is None:
+            return None
+        # Один FindById(id, False) вместо проверки ActiveWindow и поиска в finder
+        try:
+            if self.session_handle.FindById(element_id, False) is not None:
+                cache.move_to_end(key)
+                return element_id
+        except pythoncom.com_error:
+            pass
+        cache.pop(key, None) # Элемента больше нет - разрешаем локатор заново
+        return None
+
+    def find_element_id_by_locator(self, locator_str: str, target_element_types: Optional[Sequence[str]] = None) -> Optional[str]:
         """
         Находит ID элемента, используя семантический локатор.
         Это основной метод для разрешения локаторов перед вызовом действия.
@@ -1227,14 +2025,25 @@ class Window:
         Returns:
             ID найденного элемента или None, если не найден.
         """
+        key = (locator_str, tuple(target_element_types) if target_element_types is not None else None)
+        element_id = self._get_cached_locator(key)
+        if element_id is not None:
+            return element_id
+
+        cache = self._locator_cache
         try:
              # Finder сам обновит кэш, если нужно
-             return self._finder.find_element(locator_str, target_element_types)
+             element_id = self._finder.find_element(locator_str, target_element_types)
         except exceptions.SapGuiComException as e:
              log.error(f"Error during element finding process: {e}")
              return None # При ошибке возвращаем None
+        if element_id is not None:
+            cache[key] = element_id
+            if len(cache) > _LOCATOR_CACHE_SIZE:
+                cache.popitem(last=False) # Вытесняем самый старый
+        return element_id
 
-    def press_by_locator(self, locator_str: str, target_element_types: Optional[List[str]] = ["GuiButton", "GuiTab"]) -> None:
+    def press_by_locator(self, locator_str: str, target_element_types: Optional[Sequence[str]] = _PRESS_TYPES) -> None:
         """ Finds element by *semantic locator* and presses it. """
         element_id = self.find_element_id_by_locator(locator_str, target_element_types)
         if not element_id:
@@ -1242,7 +2051,7 @@ class Window:
         log.info(f"Pressing element found by locator '{locator_str}': {element_id}")
         self.press(element_id) # Вызов оригинального метода с найденным ID
 
-    def write_by_locator(self, locator_str: str, text: str, target_element_types: Optional[List[str]] = ["GuiTextField", "GuiCTextField", "GuiPasswordField", "GuiComboBox"]) -> None:
+    def write_by_locator(self, locator_str: str, text: str, target_element_types: Optional[Sequence[str]] = _WRITE_TYPES) -> None:
         """ Finds element by *semantic locator* and writes text into it. """
         element_id = self.find_element_id_by_locator(locator_str, target_element_types)
         if not element_id:
@@ -1250,7 +2059,7 @@ class Window:
         log.info(f"Writing to element found by locator '{locator_str}': {element_id}")
         self.write(element_id, text) # Вызов оригинального метода
 
-    def read_by_locator(self, locator_str: str, target_element_types: Optional[List[str]] = ["GuiTextField", "GuiCTextField", "GuiPasswordField", "GuiComboBox", "GuiLabel"]) -> str:
+    def read_by_locator(self, locator_str: str, target_element_types: Optional[Sequence[str]] = _READ_TYPES) -> str:
         """ Finds element by *semantic locator* and reads its text property. """
         element_id = self.find_element_id_by_locator(locator_str, target_element_types)
         if not element_id:
@@ -1258,7 +2067,7 @@ class Window:
         log.info(f"Reading from element found by locator '{locator_str}': {element_id}")
         return self.read(element_id) # Вызов оригинального метода
 
-    def select_by_locator(self, locator_str: str, target_element_types: Optional[List[str]] = ["GuiCheckBox", "GuiRadioButton", "GuiTab", "GuiMenu"]) -> None:
+    def select_by_locator(self, locator_str: str, target_element_types: Optional[Sequence[str]] = _SELECT_TYPES) -> None:
         """ Finds element by *semantic locator* and selects it. """
         element_id = self.find_element_id_by_locator(locator_str, target_element_types)
         if not element_id:
@@ -1266,7 +2075,7 @@ class Window:
         log.info(f"Selecting element found by locator '{locator_str}': {element_id}")
         self.select(element_id) # Вызов оригинального метода
 
-    def is_selected_by_locator(self, locator_str: str, target_element_types: Optional[List[str]] = ["GuiCheckBox", "GuiRadioButton"]) -> bool:
+    def is_selected_by_locator(self, locator_str: str, target_element_types: Optional[Sequence[str]] = _IS_SELECTED_TYPES) -> bool:
         """ Finds element by *semantic locator* and gets its selection status. """
         element_id = self.find_element_id_by_locator(locator_str, target_element_types)
         if not element_id:
@@ -1274,7 +2083,7 @@ class Window:
         log.info(f"Getting selection status for element found by locator '{locator_str}': {element_id}")
         return self.is_selected(element_id) # Вызов оригинального метода
 
-    def set_checkbox_by_locator(self, locator_str: str, selected: bool, target_element_types: Optional[List[str]] = ["GuiCheckBox"]) -> None:
+    def set_checkbox_by_locator(self, locator_str: str, selected: bool, target_element_types: Optional[Sequence[str]] = _CHECKBOX_TYPES) -> None:
         """ Finds checkbox by *semantic locator* and sets its status. """
         element_id = self.find_element_id_by_locator(locator_str, target_element_types)
         if not element_id:
@@ -1282,7 +2091,7 @@ class Window:
         log.info(f"Setting checkbox status for element found by locator '{locator_str}': {element_id}")
         self.set_checkbox(element_id, selected) # Вызов оригинального метода
 
-    def visualize_by_locator(self, locator_str: str, seconds: int = 1, target_element_types: Optional[List[str]] = None) -> None:
+    def visualize_by_locator(self, locator_str: str, seconds: int = 1, target_element_types: Optional[Sequence[str]] = None) -> None:
         """ Finds element by *semantic locator* and visualizes it. """
         # Используем типы по умолчанию, если не заданы
         effective_types = target_element_types if target_element_types is not None else DEFAULT_TARGET_TYPES
@@ -1292,16 +2101,24 @@ class Window:
         log.info(f"Visualizing element found by locator '{locator_str}': {element_id}")
         self.visualize(element_id, seconds) # Вызов оригинального метода
 
-    def exists_by_locator(self, locator_str: str, target_element_types: Optional[List[str]] = None) -> bool:
+    def exists_by_locator(self, locator_str: str, target_element_types: Optional[Sequence[str]] = None) -> bool:
         """ Checks if an element exists using a *semantic locator*. """
-        element_id = self.find_element_id_by_locator(locator_str, target_element_types)
-        return element_id is not None
+        key = (locator_str, tuple(target_element_types) if target_element_types is not None else None)
+        if self._get_cached_locator(key) is not None:
+            return True
+        try:
+             # Достаточно первого совпадения: ближайший к метке элемент не выбираем и в кэш не кладем
+             return self._finder.element_exists(locator_str, target_element_types)
+        except exceptions.SapGuiComException as e:
+             log.error(f"Error during element finding process: {e}")
+             return False
 
     # --- Вспомогательный метод для обработки исключений (можно сделать приватным) ---
     def _handle_find_or_action_exception(self, action_description: str, element_desc: str, exception_obj: Exception):
         """ Преобразует COM ошибки в специфичные исключения sapscriptwizard. """
-        error_str = str(exception_obj).lower()
-        if "findById" in error_str or "control could not be found" in error_str or "element not found" in error_str:
+        # COM ошибки классифицируем по hresult/excepinfo; текст сообщения разбираем только для прочих исключений
+        if _is_not_found_error(exception_obj) or (
+                not isinstance(exception_obj, pywintypes.com_error) and "element not found" in str(exception_obj).lower()):
              # Обертываем исходное исключение для сохранения трассировки
             raise exceptions.ElementNotFoundException(f"Element '{element_desc}' not found while {action_description}.") from exception_obj
         elif isinstance(exception_obj, exceptions.InvalidElementTypeException):